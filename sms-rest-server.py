@@ -263,27 +263,60 @@ Changelog:
 
 VERSION = "1.1.21"
 
-from flask import Flask, request, jsonify
-from werkzeug.security import check_password_hash
 import bcrypt
 import base64
-import gammu
 import time
 import os
 import sys
 import getopt
 import re
-import serial
 import subprocess
 import signal
 import atexit
 import uuid
 import threading
-from queue import Queue, Empty
-from datetime import datetime, timezone, timedelta
+from queue import Queue, SimpleQueue, Empty, Full
+from datetime import datetime, timezone
+from typing import NamedTuple
+import contextlib
+import errno
+import functools
 import getpass
-
-app = Flask(__name__)
+import grp
+import pwd
+import shutil
+import socket
+import stat
+import string
+import traceback
+import heapq
+import hashlib
+import hmac
+import importlib.util
+import json
+import logging
+import logging.handlers
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+json_loads = orjson.loads if orjson is not None else json.loads
+
+# Bound by load_gammu() before the modem is first used
+gammu = None
+
+# Flask is imported by create_app(), so CLI-only runs (--help, --install, htpasswd
+# management) never load Flask/werkzeug/Jinja2; these names are bound there
+app = None
+request = None
+jsonify = None
+Response = None
+# (rule, options, view) collected by @route until create_app() registers them
+ROUTES = []
+LOG = logging.getLogger('sms-rest-server')
 
 htpasswd_file = None
 debug = False
@@ -293,26 +326,99 @@ config_file = None
 SERVICE_PORT = 18180
 SMS_REPLY_TIMEOUT = 60
 REPLY_POLL_INTERVAL = 5
+REPLY_POLL_MAX_INTERVAL = 60
 TIMEOUT_SWEEP_INTERVAL = 5
 QUEUE_WAIT_SECONDS = 1
+SEND_BATCH_SIZE = 16
+MODEM_MAX_SEND_FAILURES = 3
+MODEM_PROBE_INTERVAL = 30
 MESSAGE_RETENTION_SECONDS = 24 * 60 * 60
+SEND_QUEUE_MAX_SIZE = 1000
 GRAFANA_WEBHOOK = False
 GRAFANA_DEFAULT_NUMBER = None
 GRAFANA_MESSAGE_MAX_LENGTH = 150
+HTTP_THREADS = 8
+BCRYPT_COST = 10
+# --bcrypt-cost auto picks the highest cost whose single hash stays under this on the current CPU,
+# but never less than BCRYPT_COST
+BCRYPT_AUTO_TARGET_SECONDS = 0.05
+AUTH_CACHE_TTL = 60
+AUTH_CACHE_MAX_ENTRIES = 256
+
+# Last `systemctl is-active ModemManager.service` answer, reused for MODEMMANAGER_STATE_TTL seconds
+MODEMMANAGER_STATE_TTL = 30
+modemmanager_state_cache = {'running': None, 'checked_at': None}
 
 modem_device = None
 global_modem = None
-
-message_store = {}
+# time.monotonic() of the last proof that global_modem works; None forces a probe
+modem_last_ok = None
+# Serializes all gammu calls on global_modem (GSM worker, /inbox, shutdown). It may be held
+# while taking shard locks or message_lock, never the other way around.
+modem_lock = threading.RLock()
+
+MESSAGE_STORE_SHARDS = 16
+message_shards = [{} for _ in range(MESSAGE_STORE_SHARDS)]
+message_shard_locks = [threading.RLock() for _ in range(MESSAGE_STORE_SHARDS)]
+# message_lock guards the pending-reply index only. Lock order: a shard lock may be held
+# while taking message_lock, never the other way around, and never two shard locks at once.
+pending_messages = set()
+pending_by_number = {}
 message_lock = threading.RLock()
-send_queue = Queue()
+send_queue = Queue(maxsize=SEND_QUEUE_MAX_SIZE)
+# Min-heap of (expire_at_ts, message_id); only the cleanup sweep pops from it
+message_expiry_heap = []
+message_expiry_lock = threading.Lock()
 worker_thread = None
+janitor_thread = None
+# (stored_hash, HMAC of the password under a per-process key) -> (result, expires_at); no plaintext is kept
+auth_cache = {}
+auth_cache_lock = threading.Lock()
+AUTH_CACHE_KEY = os.urandom(32)
+# Parsed htpasswd users, reloaded only when the file's (device, inode, mtime_ns, size) changes
+htpasswd_users_cache = {'path': None, 'stamp': None, 'users': {}, 'dummy_cost': BCRYPT_COST}
+htpasswd_users_lock = threading.Lock()
+# (error_code, from_user) -> (timestamp, encoded body) for fixed_error_response(); from_user is
+# None or an htpasswd user, so the table stays small
+fixed_error_bodies = {}
+# Pre-generated message IDs, refilled MESSAGE_ID_POOL_SIZE at a time from one urandom read
+message_id_pool = []
+message_id_pool_lock = threading.Lock()
+MESSAGE_ID_POOL_SIZE = 256
 worker_stop_event = threading.Event()
+# Set once the modem is initialized and the GSM worker is running
+modem_ready = threading.Event()
+# Set by cleanup_modem(); shutdown_lock orders it against the modem-init thread starting the worker
+shutdown_requested = threading.Event()
+shutdown_lock = threading.RLock()
+modem_init_failed = False
+# Set from the gammu incoming-SMS callback; the worker polls the inbox early when it is set
+incoming_sms_event = threading.Event()
 LOCAL_TIMEZONE = datetime.now().astimezone().tzinfo
 
-OPERATOR_SERVICE_NUMBERS = ['2222', '7373', '333']
+OPERATOR_SERVICE_NUMBERS = frozenset(('2222', '7373', '333'))
+REQUIRED_SEND_FIELDS = frozenset(('number', 'message'))
 
 LOCAL_COUNTRY_CODE = '+52'
+
+DIGIT_RUN_RE = re.compile(r'\d+')
+# Phone shapes are checked with str.isdecimal() and len() rather than regexes:
+# E.164 is '+' and a 1-3 digit country code plus 4-14 digits, local numbers are 10 digits
+E164_MIN_DIGITS = 5
+E164_MAX_DIGITS = 17
+LOCAL_NUMBER_DIGITS = 10
+PHONE_SEPARATORS_TABLE = str.maketrans('', '', ' -')
+# [SMS] timestamp | message id | sender (ip) → number | OUTCOME (reply expected) | 'preview...'
+SMS_LOG_FORMAT = "[SMS] %s | %s | %s%s → %s | %s%s | '%s%s'"
+GAMMURC_PORT_RE = re.compile(r'^[ \t]*port[^=\n]*=([^\n]*)', re.MULTILINE)
+gammurc_port_cache = {}
+# Only ttyUSB is auto-probed: opening a CDC-ACM port resets Arduino-type boards, so ttyACM
+# modems must be named with --device/DEVICE
+SERIAL_PORT_PREFIXES = ('ttyUSB',)
+# Port and USB identity of the last modem that initialized, probed first when detection is needed
+LAST_MODEM_FILE = '~/.sms-rest-server-modem.json'
+# Upper bound for one AT probe reply; read_until returns at 'OK' long before this
+AT_RESPONSE_MAX_BYTES = 4096
 ERROR_CODES = {
     'AUTHENTICATION_REQUIRED': 'Authentication required',
     'INVALID_CONTENT_TYPE': 'Content-Type must be application/json',
@@ -326,6 +432,7 @@ ERROR_CODES = {
     'MODEM_DEVICE_ERROR': 'Device not found',
     'MODEM_PERMISSION_ERROR': 'Permission denied',
     'SEND_FAILED': 'Failed to send SMS',
+    'QUEUE_FULL': 'Send queue is full, retry later',
     'NOT_FOUND': 'Message not found'
 }
 
@@ -341,12 +448,28 @@ def format_timestamp(dt=None):
         target = datetime.now(timezone.utc)
     else:
         target = ensure_utc(dt)
-    return target.strftime('%Y-%m-%dT%H:%M:%SZ')
+    return (f"{target.year:04d}-{target.month:02d}-{target.day:02d}"
+            f"T{target.hour:02d}:{target.minute:02d}:{target.second:02d}Z")
+
+
+def json_response(payload, http_status=200):
+    if orjson is None:
+        return jsonify(payload), http_status
+    return Response(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS),
+                    status=http_status, mimetype='application/json')
 
 
 def build_api_response(status, message_id=None, to=None, from_user=None, message_text=None,
                        error_code=None, error_message=None, reply_data=None, meta=None,
                        http_status=200, timestamp_override=None):
+    response = build_api_payload(status, message_id, to, from_user, message_text, error_code,
+                                 error_message, reply_data, meta, timestamp_override)
+    return json_response(response, http_status)
+
+
+def build_api_payload(status, message_id=None, to=None, from_user=None, message_text=None,
+                      error_code=None, error_message=None, reply_data=None, meta=None,
+                      timestamp_override=None):
     if timestamp_override is not None:
         if isinstance(timestamp_override, str):
             timestamp = timestamp_override
@@ -372,60 +495,181 @@ def build_api_response(status, message_id=None, to=None, from_user=None, message
     if meta:
         response['meta'] = meta
 
-    return jsonify(response), http_status
+    return response
+
+
+def fixed_error_response(error_code, error_message, http_status, from_user=None):
+    # Rejections before the body is read (bad credentials, content type, JSON) differ only in their
+    # second-resolution timestamp, so a burst of them within one second reuses the encoded body
+    if orjson is None:
+        return build_api_response(status='failed', from_user=from_user, error_code=error_code,
+                                  error_message=error_message, http_status=http_status)
+    timestamp = format_timestamp()
+    key = (error_code, from_user)
+    cached = fixed_error_bodies.get(key)
+    if cached is None or cached[0] != timestamp:
+        payload = build_api_payload('failed', from_user=from_user, error_code=error_code,
+                                    error_message=error_message, timestamp_override=timestamp)
+        cached = (timestamp, orjson.dumps(payload, option=orjson.OPT_SORT_KEYS))
+        fixed_error_bodies[key] = cached
+    return Response(cached[1], status=http_status, mimetype='application/json')
 
 
 def ensure_utc(dt):
     if dt is None:
         return None
-    if dt.tzinfo is None:
+    tz = dt.tzinfo
+    if tz is timezone.utc:
+        return dt
+    if tz is None:
         return dt.replace(tzinfo=LOCAL_TIMEZONE).astimezone(timezone.utc)
     return dt.astimezone(timezone.utc)
 
 
+class MessageRecord:
+    __slots__ = (
+        'message_id', 'original_number', 'to_number', 'message', 'from_user', 'status',
+        'created_at', 'sent_at', 'sent_at_ts', 'requires_reply', 'timeout_seconds',
+        'reply_text', 'reply_at', 'elapsed_seconds', 'error_code', 'error_message',
+        'meta', 'client_ip'
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class SendJob(NamedTuple):
+    message_id: str
+    to_number: str
+    message: str
+    from_user: str
+    client_ip: str
+    requires_reply: bool = False
+
+
+def new_message_id():
+    with message_id_pool_lock:
+        if not message_id_pool:
+            entropy = os.urandom(16 * MESSAGE_ID_POOL_SIZE)
+            message_id_pool.extend(
+                str(uuid.UUID(bytes=entropy[offset:offset + 16], version=4))
+                for offset in range(0, len(entropy), 16)
+            )
+        return message_id_pool.pop()
+
+
 def create_message_record(message_id, *, original_number, normalized_number, message_text,
                           username, requires_reply, timeout_seconds, meta, client_ip):
     now = datetime.now(timezone.utc)
-    record = {
-        'message_id': message_id,
-        'original_number': original_number,
-        'to_number': normalized_number,
-        'message': message_text,
-        'from_user': username,
-        'status': 'queued',
-        'created_at': now,
-        'sent_at': None,
-        'requires_reply': requires_reply,
-        'timeout_seconds': timeout_seconds if requires_reply else None,
-        'reply_text': None,
-        'reply_at': None,
-        'elapsed_seconds': None,
-        'error_code': None,
-        'error_message': None,
-        'meta': meta,
-        'client_ip': client_ip
-    }
+    record = MessageRecord(
+        message_id=message_id,
+        original_number=original_number,
+        to_number=normalized_number,
+        message=message_text,
+        from_user=username,
+        status='queued',
+        created_at=now,
+        requires_reply=requires_reply,
+        timeout_seconds=timeout_seconds if requires_reply else None,
+        meta=meta,
+        client_ip=client_ip
+    )
 
-    with message_lock:
-        message_store[message_id] = record
+    shard, lock = _message_shard(message_id)
+    with lock:
+        shard[message_id] = record
+
+    if MESSAGE_RETENTION_SECONDS > 0:
+        with message_expiry_lock:
+            heapq.heappush(message_expiry_heap, (now.timestamp() + MESSAGE_RETENTION_SECONDS, message_id))
 
     return record
 
 
-def update_message_record(message_id, **updates):
+def discard_message_record(message_id):
+    shard, lock = _message_shard(message_id)
+    with lock:
+        record = shard.pop(message_id, None)
+        if record:
+            with message_lock:
+                _unindex_pending(message_id, record)
+    return record
+
+
+def _message_shard(message_id):
+    index = hash(message_id) & (MESSAGE_STORE_SHARDS - 1)
+    return message_shards[index], message_shard_locks[index]
+
+
+def _pending_message_ids():
     with message_lock:
-        record = message_store.get(message_id)
+        return list(pending_messages)
+
+
+def _unindex_pending(message_id, record=None):
+    # Caller must hold message_lock. Without a record the number is unknown, so every bucket is checked.
+    pending_messages.discard(message_id)
+    to_numbers = [record.to_number] if record is not None else list(pending_by_number)
+    for to_number in to_numbers:
+        pending_ids = pending_by_number.get(to_number)
+        if pending_ids is not None:
+            pending_ids.discard(message_id)
+            if not pending_ids:
+                del pending_by_number[to_number]
+
+
+def _reindex_pending(message_id, record):
+    # Caller must hold message_lock. Only 'sent' messages awaiting a reply are indexed.
+    if record.requires_reply and record.status == 'sent':
+        pending_messages.add(message_id)
+        pending_by_number.setdefault(record.to_number, set()).add(message_id)
+    else:
+        _unindex_pending(message_id, record)
+
+
+def _set_status(message_id, record, new_status):
+    # Caller must hold the record's shard lock
+    record.status = new_status
+    with message_lock:
+        _reindex_pending(message_id, record)
+
+
+def update_message_record(message_id, **updates):
+    shard, lock = _message_shard(message_id)
+    with lock:
+        record = shard.get(message_id)
         if not record:
-            return None
+            return False
         for key, value in updates.items():
-            record[key] = value
-        return record.copy()
+            setattr(record, key, value)
+        if 'status' in updates:
+            with message_lock:
+                _reindex_pending(message_id, record)
+        return True
 
 
 def get_message_record(message_id):
-    with message_lock:
-        record = message_store.get(message_id)
-        return record.copy() if record else None
+    shard, lock = _message_shard(message_id)
+    with lock:
+        record = shard.get(message_id)
+        return record.to_dict() if record else None
+
+
+STATUS_RESPONSE_FIELDS = (
+    'status', 'message_id', 'original_number', 'from_user', 'message', 'meta',
+    'error_code', 'error_message', 'created_at', 'sent_at', 'reply_text', 'reply_at', 'elapsed_seconds'
+)
+
+
+def snapshot_message_fields(message_id, *fields):
+    shard, lock = _message_shard(message_id)
+    with lock:
+        record = shard.get(message_id)
+        return {key: getattr(record, key) for key in fields} if record else None
 
 
 def determine_record_timestamp(record):
@@ -448,142 +692,212 @@ def apply_reply_to_message(sender_number, reply_text, sms_datetime):
     if not sender_number:
         return None
 
+    is_saldo_text = 'saldo' in reply_text.lower()
+    # Stored to_number values are already normalized, so candidates compare with plain ==
+    sender_norm = normalize_phone_number(sender_number)
+
+    with message_lock:
+        candidate_ids = set(pending_by_number.get(sender_norm, ()))
+        if '333' in pending_by_number and is_saldo_text:
+            candidate_ids.update(pending_by_number['333'])
+        if '7373' in pending_by_number:
+            candidate_ids.update(pending_by_number['7373'])
+
+    # Most inbox SMS (operator promos, unrelated senders) stop here, before any date handling
+    if not candidate_ids:
+        return None
+
     sms_dt = ensure_utc(sms_datetime) or datetime.now(timezone.utc)
+    sms_ts = sms_dt.timestamp()
     best_id = None
-    best_record = None
+    best_sent_at_ts = None
 
-    with message_lock:
-        for message_id, record in message_store.items():
-            if not record.get('requires_reply') or record.get('status') != 'sent':
+    for message_id in candidate_ids:
+        shard, lock = _message_shard(message_id)
+        with lock:
+            record = shard.get(message_id)
+            if not record or not record.requires_reply or record.status != 'sent':
                 continue
 
-            to_number = record.get('to_number')
-            message_text = record.get('message', '')
+            to_number = record.to_number
+            message_text = record.message or ''
+            sent_at_ts = record.sent_at_ts
+            timeout_window = record.timeout_seconds or SMS_REPLY_TIMEOUT
 
-            is_balance_reply = (to_number == '333' and 'saldo' in reply_text.lower())
+        is_balance_reply = (to_number == '333' and is_saldo_text)
 
-            is_recharge_reply = False
-            if to_number == '7373':
-                match = re.search(r'\d+', message_text)
-                if match:
-                    device_number = match.group(0)
-                    is_recharge_reply = device_number in reply_text
+        is_recharge_reply = False
+        if to_number == '7373':
+            match = DIGIT_RUN_RE.search(message_text)
+            if match:
+                device_number = match.group(0)
+                is_recharge_reply = device_number in reply_text
 
-            if not is_balance_reply and not is_recharge_reply and not phone_numbers_match(to_number, sender_number):
-                continue
+        if not is_balance_reply and not is_recharge_reply and to_number != sender_norm:
+            continue
 
-            sent_at = record.get('sent_at')
-            if not sent_at:
-                continue
+        if sent_at_ts is None:
+            continue
 
-            timeout_window = record.get('timeout_seconds') or SMS_REPLY_TIMEOUT
-            deadline = sent_at + timedelta(seconds=timeout_window)
+        if sms_ts <= sent_at_ts or sms_ts > sent_at_ts + timeout_window:
+            continue
 
-            if sms_dt <= sent_at or sms_dt > deadline:
-                continue
+        if best_id is None or sent_at_ts > best_sent_at_ts:
+            best_id = message_id
+            best_sent_at_ts = sent_at_ts
 
-            if best_record is None or sent_at > best_record.get('sent_at'):
-                best_id = message_id
-                best_record = record
+    if best_id is None:
+        return None
 
-        if not best_record:
+    shard, lock = _message_shard(best_id)
+    with lock:
+        best_record = shard.get(best_id)
+        if not best_record or best_record.status != 'sent':
             return None
 
-        elapsed = None
-        if best_record.get('sent_at'):
-            elapsed = max(int((sms_dt - best_record['sent_at']).total_seconds()), 0)
+        elapsed = max(int(sms_ts - best_sent_at_ts), 0)
 
-        best_record.update({
-            'status': 'replied',
-            'reply_text': reply_text,
-            'reply_at': sms_dt,
-            'elapsed_seconds': elapsed,
-            'error_code': None,
-            'error_message': None
-        })
+        _set_status(best_id, best_record, 'replied')
+        best_record.reply_text = reply_text
+        best_record.reply_at = sms_dt
+        best_record.elapsed_seconds = elapsed
+        best_record.error_code = None
+        best_record.error_message = None
+        from_user = best_record.from_user or 'unknown'
 
-        msg_id_display = best_id if best_id else "no-msg-id"
-        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-        reply_preview = f"'{reply_text[:50]}{'...' if len(reply_text) > 50 else ''}'"
-        from_user = best_record.get('from_user', 'unknown')
-        print(f"[REPLY] {timestamp} | {msg_id_display} | {sender_number} → {from_user} | RECEIVED | {reply_preview} (elapsed: {elapsed}s)")
+    LOG.info("[REPLY] %s | %s | %s → %s | RECEIVED | '%s%s' (elapsed: %ss)",
+             time.strftime('%Y-%m-%d %H:%M:%S'), best_id or "no-msg-id", sender_number, from_user,
+             reply_text[:50], '...' if len(reply_text) > 50 else '', elapsed)
 
-        return best_id
+    return best_id
 
 
-def handle_timeouts():
-    now = datetime.now(timezone.utc)
-    timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-    with message_lock:
-        for message_id, record in message_store.items():
-            if not record.get('requires_reply') or record.get('status') != 'sent':
+def pending_reply_deadline():
+    earliest = None
+    for message_id in _pending_message_ids():
+        shard, lock = _message_shard(message_id)
+        with lock:
+            record = shard.get(message_id)
+            if not record or record.sent_at_ts is None:
                 continue
-            sent_at = record.get('sent_at')
-            if not sent_at:
+            timeout_window = record.timeout_seconds or SMS_REPLY_TIMEOUT
+            deadline = record.sent_at_ts + timeout_window
+        if earliest is None or deadline < earliest:
+            earliest = deadline
+    return earliest
+
+
+def handle_timeouts(now=None):
+    if now is None:
+        now = datetime.now(timezone.utc)
+    now_ts = now.timestamp()
+    timed_out = []
+    for message_id in _pending_message_ids():
+        shard, lock = _message_shard(message_id)
+        with lock:
+            record = shard.get(message_id)
+            if not record:
+                with message_lock:
+                    _unindex_pending(message_id)
+                continue
+            sent_at_ts = record.sent_at_ts
+            if sent_at_ts is None:
                 continue
 
-            timeout_window = record.get('timeout_seconds') or SMS_REPLY_TIMEOUT
-            deadline = sent_at + timedelta(seconds=timeout_window)
-            if now > deadline:
-                record['status'] = 'timeout'
-                elapsed = int((now - sent_at).total_seconds())
-                record['elapsed_seconds'] = max(elapsed, timeout_window)
-                record['reply_text'] = None
-                record['reply_at'] = None
-
-                msg_id_display = message_id if message_id else "no-msg-id"
-                from_user = record.get('from_user', 'unknown')
-                to_number = record.get('to_number', 'unknown')
-                print(f"[REPLY] {timestamp} | {msg_id_display} | {from_user} → {to_number} | TIMEOUT | waited {timeout_window}s")
+            timeout_window = record.timeout_seconds or SMS_REPLY_TIMEOUT
+            if now_ts > sent_at_ts + timeout_window:
+                _set_status(message_id, record, 'timeout')
+                elapsed = int(now_ts - sent_at_ts)
+                record.elapsed_seconds = max(elapsed, timeout_window)
+                record.reply_text = None
+                record.reply_at = None
+                timed_out.append((message_id or "no-msg-id", record.from_user or 'unknown',
+                                  record.to_number or 'unknown', timeout_window))
+
+    if timed_out:
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        for msg_id_display, from_user, to_number, timeout_window in timed_out:
+            LOG.info("[REPLY] %s | %s | %s → %s | TIMEOUT | waited %ss",
+                     timestamp, msg_id_display, from_user, to_number, timeout_window)
 
 
 def poll_incoming_replies(sm):
-    cleanup_expired_messages()
     try:
-        messages = get_sms_with_locations(sm)
+        status = sm.GetSMSStatus()
+        if status['SIMUsed'] + status['PhoneUsed'] == 0:
+            return 0
     except Exception as exc:
-        if debug:
-            print(f"[REPLY] Poll error: {exc}")
-        return False
+        LOG.debug("[REPLY] Poll error: %s", exc)
+        return None
 
-    for sms in messages:
-        sender = str(sms.get('Number', '')).strip()
-        sms_dt = ensure_utc(sms.get('DateTime')) or datetime.now(timezone.utc)
-        reply_text = sms.get('Text', '')
-        location = sms.get('Location')
-        folder = sms.get('Folder', 0)
-
-        matched_id = apply_reply_to_message(sender, reply_text, sms_dt)
-        if matched_id:
-            if debug:
-                print(f"[REPLY] Matched incoming SMS from {sender} to message {matched_id}")
-            try:
+    # Messages are matched as they are read; replies already applied before a
+    # read error are still deleted, but the poll reports the error
+    matched_locations = []
+    poll_failed = False
+    try:
+        for sms in iter_sms_with_locations(sm, status):
+            sender = str(sms.get('Number', '')).strip()
+            sms_dt = ensure_utc(sms.get('DateTime')) or datetime.now(timezone.utc)
+            reply_text = sms.get('Text', '')
+            location = sms.get('Location')
+            folder = sms.get('Folder', 0)
+
+            matched_id = apply_reply_to_message(sender, reply_text, sms_dt)
+            if matched_id:
+                LOG.debug("[REPLY] Matched incoming SMS from %s to message %s", sender, matched_id)
                 if location is not None:
-                    sm.DeleteSMS(Folder=folder, Location=location)
-            except Exception as exc:
-                if debug:
-                    print(f"[REPLY] Failed to delete SMS at location {location}: {exc}")
+                    matched_locations.append((folder, location))
+    except Exception as exc:
+        LOG.debug("[REPLY] Poll error: %s", exc)
+        poll_failed = True
 
-    return True
+    for folder, location in matched_locations:
+        try:
+            sm.DeleteSMS(Folder=folder, Location=location)
+        except Exception as exc:
+            LOG.debug("[REPLY] Failed to delete SMS at location %s: %s", location, exc)
+
+    if poll_failed:
+        return None
+    return len(matched_locations)
 
 
-def cleanup_expired_messages():
+def cleanup_expired_messages(now=None):
     if MESSAGE_RETENTION_SECONDS <= 0:
         return
 
-    cutoff = datetime.now(timezone.utc) - timedelta(seconds=MESSAGE_RETENTION_SECONDS)
+    if now is None:
+        now = datetime.now(timezone.utc)
+    now_ts = now.timestamp()
+    with message_expiry_lock:
+        expired_ids = []
+        while message_expiry_heap and message_expiry_heap[0][0] <= now_ts:
+            expired_ids.append(heapq.heappop(message_expiry_heap)[1])
+
+    if not expired_ids:
+        return
+    # One formatted timestamp for the whole sweep, and none when nothing expired
     timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-    removed = []
-    with message_lock:
-        for message_id, record in list(message_store.items()):
-            created_at = record.get('created_at')
-            if created_at and created_at < cutoff:
-                age_hours = int((datetime.now(timezone.utc) - created_at).total_seconds() / 3600)
-                status = record.get('status', 'unknown')
-                msg_id_display = message_id if message_id else "no-msg-id"
-                print(f"[STORE] {timestamp} | {msg_id_display} | EXPIRED | age: {age_hours}h, status: {status}")
-                removed.append(message_id)
-                del message_store[message_id]
+    for message_id in expired_ids:
+        record = discard_message_record(message_id)
+        if not record:
+            continue
+        created_at = record.created_at
+        age_hours = int((now - created_at).total_seconds() / 3600) if created_at else 0
+        status = record.status or 'unknown'
+        LOG.info("[STORE] %s | %s | EXPIRED | age: %sh, status: %s",
+                 timestamp, message_id or "no-msg-id", age_hours, status)
+
+
+def enqueue_send_job(job_payload):
+    try:
+        send_queue.put(job_payload, block=False)
+        return True
+    except Full:
+        discard_message_record(job_payload.message_id)
+        LOG.warning("[QUEUE] %s | %s | REJECTED | send queue full (%s jobs)",
+                    time.strftime('%Y-%m-%d %H:%M:%S'), job_payload.message_id, send_queue.maxsize)
+        return False
 
 
 def process_grafana_alert(alert, alert_index, client_ip, username='grafana'):
@@ -641,7 +955,7 @@ def process_grafana_alert(alert, alert_index, client_ip, username='grafana'):
                 'error': f'Invalid phone number: {error_msg}'
             }
 
-        msg_id = str(uuid.uuid4())
+        msg_id = new_message_id()
 
         meta = None
         if truncated:
@@ -663,17 +977,22 @@ def process_grafana_alert(alert, alert_index, client_ip, username='grafana'):
             client_ip=client_ip
         )
 
-        job_payload = {
-            'message_id': msg_id,
-            'to_number': normalized_number,
-            'message': final_message,
-            'from_user': username,
-            'requires_reply': False,
-            'timeout_seconds': None,
-            'client_ip': client_ip
-        }
+        job_payload = SendJob(
+            message_id=msg_id,
+            to_number=normalized_number,
+            message=final_message,
+            from_user=username,
+            client_ip=client_ip
+        )
 
-        send_queue.put(job_payload)
+        if not enqueue_send_job(job_payload):
+            return {
+                'alert_index': alert_index,
+                'alert_name': alert_name,
+                'phone_number': phone_number,
+                'success': False,
+                'error': ERROR_CODES['QUEUE_FULL']
+            }
 
         return {
             'alert_index': alert_index,
@@ -687,7 +1006,6 @@ def process_grafana_alert(alert, alert_index, client_ip, username='grafana'):
 
     except Exception as e:
         if debug:
-            import traceback
             traceback.print_exc()
         return {
             'alert_index': alert_index,
@@ -697,18 +1015,66 @@ def process_grafana_alert(alert, alert_index, client_ip, username='grafana'):
         }
 
 
-def process_send_job(sm, job):
-    message_id = job['message_id']
+def resolve_smsc(sm):
+    # Resolve the SMSC number once so a batch of SendSMS calls doesn't re-read it per message
+    try:
+        smsc = sm.GetSMSC(Location=1)
+        if smsc.get('Number'):
+            return {'Number': smsc['Number']}
+    except Exception as exc:
+        LOG.debug("[WORKER] Could not read SMSC, using location 1 per message: %s", exc)
+    return {'Location': 1}
+
+
+def modem_is_healthy(sm):
+    # AT+CBC is a single cheap round-trip; a reply means the serial link still works
+    try:
+        sm.GetBatteryCharge()
+        return True
+    except Exception:
+        return False
+
+
+def on_incoming_modem_event(sm, event_type, data):
+    if event_type == 'SMS':
+        incoming_sms_event.set()
+
+
+def enable_incoming_sms_notifications(sm):
+    # Ask the modem to announce new SMS (+CMTI) so replies are picked up as they land
+    # instead of on the next backed-off inbox poll; modems without support just keep polling
+    try:
+        sm.SetIncomingCallback(on_incoming_modem_event)
+        sm.SetIncomingSMS()
+        return True
+    except Exception as exc:
+        LOG.debug("[WORKER] Incoming SMS notifications unavailable, polling only: %s", exc)
+        return False
+
+
+def drain_send_jobs(first_job):
+    jobs = [first_job]
+    while len(jobs) < SEND_BATCH_SIZE:
+        try:
+            jobs.append(send_queue.get_nowait())
+        except Empty:
+            break
+    return jobs
+
+
+def process_send_job(sm, job, smsc=None):
+    message_id = job.message_id
     now = datetime.now(timezone.utc)
 
     sms_success, sms_status, sms_details = send_sms(
         sm,
-        job['to_number'],
-        job['message'],
-        sender_user=job.get('from_user'),
-        source_ip=job.get('client_ip'),
-        reply_expected=job.get('requires_reply', False),
-        message_id=message_id
+        job.to_number,
+        job.message,
+        sender_user=job.from_user,
+        source_ip=job.client_ip,
+        reply_expected=job.requires_reply,
+        message_id=message_id,
+        smsc=smsc
     )
 
     if sms_success:
@@ -716,6 +1082,7 @@ def process_send_job(sm, job):
             message_id,
             status='sent',
             sent_at=now,
+            sent_at_ts=now.timestamp(),
             error_code=None,
             error_message=None
         )
@@ -726,6 +1093,7 @@ def process_send_job(sm, job):
             message_id,
             status='failed',
             sent_at=now,
+            sent_at_ts=now.timestamp(),
             error_code=error_code,
             error_message=sms_details
         )
@@ -734,8 +1102,11 @@ def process_send_job(sm, job):
 
 def gsm_worker_loop():
     sm = None
-    last_reply_poll = 0
-    last_timeout_check = 0
+    last_reply_poll = float('-inf')
+    reply_poll_interval = REPLY_POLL_INTERVAL
+    consecutive_failures = 0
+    notify_sm = None
+    notify_enabled = False
 
     while not worker_stop_event.is_set() or not send_queue.empty():
         job = None
@@ -744,121 +1115,231 @@ def gsm_worker_loop():
         except Empty:
             job = None
 
-        if job:
-            if sm is None:
-                sm = get_modem_connection()
-            if not sm:
-                update_message_record(
-                    job['message_id'],
-                    status='failed',
-                    sent_at=datetime.now(timezone.utc),
-                    error_code='MODEM_NOT_AVAILABLE',
-                    error_message=ERROR_CODES['MODEM_NOT_AVAILABLE']
-                )
-                send_queue.task_done()
-            else:
+        with modem_lock:
+            smsc = None
+            for job in (drain_send_jobs(job) if job else ()):
+                if sm is None:
+                    sm = get_modem_connection()
+                    smsc = None
+                if not sm:
+                    update_message_record(
+                        job.message_id,
+                        status='failed',
+                        sent_at=datetime.now(timezone.utc),
+                        error_code='MODEM_NOT_AVAILABLE',
+                        error_message=ERROR_CODES['MODEM_NOT_AVAILABLE']
+                    )
+                    send_queue.task_done()
+                    continue
+
+                if smsc is None:
+                    smsc = resolve_smsc(sm)
                 try:
-                    success, failure_status = process_send_job(sm, job)
-                    if not success and failure_status in ('device_error', 'permission_error'):
-                        sm = None
+                    success, failure_status = process_send_job(sm, job, smsc)
                 except Exception as exc:
                     update_message_record(
-                        job['message_id'],
+                        job.message_id,
                         status='failed',
                         sent_at=datetime.now(timezone.utc),
                         error_code='SEND_FAILED',
                         error_message=str(exc)
                     )
-                    if debug:
-                        print(f"[WORKER] Send job error: {exc}")
-                    sm = None
+                    LOG.debug("[WORKER] Send job error: %s", exc)
+                    success, failure_status = False, 'failed'
                 finally:
                     send_queue.task_done()
 
-        now = time.time()
-        if now - last_reply_poll >= REPLY_POLL_INTERVAL:
-            if sm is None:
-                sm = get_modem_connection()
-            if sm:
-                poll_success = poll_incoming_replies(sm)
-                if not poll_success:
-                    sm = None
-            last_reply_poll = now
-
-        if now - last_timeout_check >= TIMEOUT_SWEEP_INTERVAL:
-            handle_timeouts()
-            last_timeout_check = now
-
-    if debug:
-        print("[WORKER] GSM worker stopped")
+                if success:
+                    consecutive_failures = 0
+                    mark_modem_alive()
+                    if job.requires_reply:
+                        reply_poll_interval = REPLY_POLL_INTERVAL
+                    continue
 
+                consecutive_failures += 1
+                if (failure_status == 'device_error' or consecutive_failures >= MODEM_MAX_SEND_FAILURES
+                        or not modem_is_healthy(sm)):
+                    LOG.debug("[WORKER] Dropping modem connection after %s failed send(s) (%s)",
+                              consecutive_failures, failure_status)
+                    mark_modem_suspect()
+                    sm = None
+                    consecutive_failures = 0
+
+        now = time.monotonic()
+        reply_deadline = pending_reply_deadline()
+        if reply_deadline is None:
+            # Nothing awaits a reply, so leave the modem inbox alone
+            reply_poll_interval = REPLY_POLL_INTERVAL
+            incoming_sms_event.clear()
+        else:
+            with modem_lock:
+                if sm is not None and sm is not notify_sm:
+                    notify_sm = sm
+                    notify_enabled = enable_incoming_sms_notifications(sm)
+                if notify_enabled and sm is notify_sm:
+                    try:
+                        # Non-blocking: dispatches any notification the modem has sent since the last pass
+                        sm.ReadDevice()
+                    except Exception as exc:
+                        LOG.debug("[WORKER] ReadDevice error: %s", exc)
+                # Deadlines are wall-clock (they are compared against modem SMS dates); schedule on the monotonic clock
+                reply_deadline = now + (reply_deadline - time.time())
+                next_reply_poll = last_reply_poll + reply_poll_interval
+                if reply_deadline > last_reply_poll:
+                    # Always look at the inbox once more before a pending message can time out
+                    next_reply_poll = min(next_reply_poll, reply_deadline)
+                if incoming_sms_event.is_set():
+                    # The modem announced a new SMS; check now instead of waiting out the backoff
+                    incoming_sms_event.clear()
+                    next_reply_poll = now
+                if now >= next_reply_poll:
+                    if sm is None:
+                        sm = get_modem_connection()
+                    if sm:
+                        matched = poll_incoming_replies(sm)
+                        if matched is None:
+                            mark_modem_suspect()
+                            sm = None
+                        elif matched:
+                            reply_poll_interval = REPLY_POLL_INTERVAL
+                        else:
+                            reply_poll_interval = min(reply_poll_interval * 2, REPLY_POLL_MAX_INTERVAL)
+                    last_reply_poll = now
+
+    LOG.debug("[WORKER] GSM worker stopped")
+
+
+def janitor_loop():
+    while not worker_stop_event.wait(TIMEOUT_SWEEP_INTERVAL):
+        now = datetime.now(timezone.utc)
+        try:
+            cleanup_expired_messages(now)
+            handle_timeouts(now)
+        except Exception as exc:
+            LOG.debug("[STORE] Janitor sweep error: %s", exc)
+
+
+MODEM_INIT_FAILED_MESSAGE = """
+❌ FATAL: Failed to initialize modem. Service cannot start without modem.
+   Please check:
+   - GSM modem is connected via USB
+   - Port permissions (add user to dialout group)
+   - ModemManager is not interfering (sudo systemctl stop ModemManager)
+   - Device path is correct (use --device option if needed)
+""".encode('utf-8')
+
+def start_modem_in_background():
+    # Port detection, AT probes and inbox cleanup can take seconds; run them while the HTTP
+    # server binds. Sends and /inbox answer 503 until modem_ready is set, so nothing is accepted
+    # that a failed init would have to drop.
+    def init_modem_and_worker():
+        global modem_init_failed
+        with modem_lock:
+            initialized = not shutdown_requested.is_set() and initialize_global_modem()
+        with shutdown_lock:
+            if shutdown_requested.is_set():
+                return
+            if initialized:
+                start_gsm_worker()
+                modem_ready.set()
+                return
+            modem_init_failed = True
+
+        sys.stdout.flush()
+        os.write(2, MODEM_INIT_FAILED_MESSAGE)
+        # The main thread is inside the HTTP server; its SIGTERM handler exits with status 1 through
+        # the normal atexit path, so the log listener is flushed (systemd restarts the service)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    threading.Thread(target=init_modem_and_worker, name='modem-init', daemon=True).start()
 
 def start_gsm_worker():
-    global worker_thread
+    global worker_thread, janitor_thread
     if worker_thread and worker_thread.is_alive():
         return
     worker_stop_event.clear()
     worker_thread = threading.Thread(target=gsm_worker_loop, name='gsm-worker', daemon=True)
     worker_thread.start()
-    if debug:
-        print("[WORKER] GSM worker started")
+    janitor_thread = threading.Thread(target=janitor_loop, name='store-janitor', daemon=True)
+    janitor_thread.start()
+    LOG.debug("[WORKER] GSM worker started")
 
 
 def stop_gsm_worker():
-    global worker_thread
+    global worker_thread, janitor_thread
     worker_stop_event.set()
     if worker_thread and worker_thread.is_alive():
         worker_thread.join(timeout=5)
+    if janitor_thread and janitor_thread.is_alive():
+        janitor_thread.join(timeout=5)
     worker_thread = None
+    janitor_thread = None
 
 def read_port_from_gammurc():
     config_path = os.path.expanduser('~/.gammurc')
+    if config_path in gammurc_port_cache:
+        return gammurc_port_cache[config_path]
 
-    if not os.path.exists(config_path):
-        return None
-
+    port = None
     try:
         with open(config_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith('port') and '=' in line:
-                    port = line.split('=')[1].strip()
-                    return port
+            match = GAMMURC_PORT_RE.search(f.read())
+        if match:
+            port = match.group(1).split('=')[0].strip()
     except Exception:
-        return None
+        pass
 
-    return None
+    gammurc_port_cache[config_path] = port
+    return port
+
+def load_gammu():
+    # python-gammu loads libGammu, so it is imported only by the process that will own the modem;
+    # --install, --check-config, htpasswd management and the reloader parent never need it
+    global gammu
+    if gammu is None:
+        import gammu
+    return gammu
 
 def test_existing_gammu_config():
     try:
-        sm = gammu.StateMachine()
+        sm = load_gammu().StateMachine()
         sm.ReadConfig()
         sm.Init()
 
+        # The initialized StateMachine is handed back so callers do not Init twice
         try:
             manufacturer = sm.GetManufacturer()
-            sm.Terminate()
-            return True, manufacturer
+            return True, manufacturer, sm
         except:
-            sm.Terminate()
-            return True, "Unknown"
+            return True, "Unknown", sm
 
     except Exception:
-        return False, None
+        return False, None, None
 
 def clear_inbox_with_gammu(sm):
+    # python-gammu has no DeleteAllSMS; one AT+CPMS round-trip at least skips the per-folder
+    # walk when storage is already empty (the usual case on restart, since we cleaned last time)
+    try:
+        status = sm.GetSMSStatus()
+        if status['SIMUsed'] + status['PhoneUsed'] == 0:
+            LOG.info("[CLEAN] SMS inbox already empty")
+            return True
+    except Exception as exc:
+        LOG.debug("⚠️ Could not read SMS status, scanning folders: %s", exc)
+
     try:
         folders = sm.GetSMSFolders()
     except Exception as exc:
-        print(f"❌ Unable to read SMS folders: {exc}")
+        LOG.warning("❌ Unable to read SMS folders: %s", exc)
         return False
 
-    cleaned = 0
+    # Walk every folder first and delete afterwards, so the GetNextSMS cursor
+    # never points at a location that was already removed
+    locations = []
     for folder in folders:
         folder_id = folder.get('Folder', 0)
         folder_name = folder.get('Name', f"Folder {folder_id}")
-        if debug:
-            print(f"🗑️ Cleaning SMS folder {folder_id} ({folder_name})...")
+        LOG.debug("🗑️ Cleaning SMS folder %s (%s)...", folder_id, folder_name)
         start = True
         last_batch = None
         while True:
@@ -871,25 +1352,28 @@ def clear_inbox_with_gammu(sm):
             except gammu.ERR_EMPTY:
                 break
             except Exception as exc:
-                print(f"❌ Error reading folder {folder_id} ({folder_name}): {exc}")
+                LOG.warning("❌ Error reading folder %s (%s): %s", folder_id, folder_name, exc)
                 break
 
             for message in last_batch:
-                location = message.get('Location')
-                try:
-                    sm.DeleteSMS(Folder=folder_id, Location=location)
-                    cleaned += 1
-                except Exception as exc:
-                    print(f"❌ Failed to delete SMS at folder {folder_id}, location {location}: {exc}")
+                locations.append((folder_id, message.get('Location')))
+
+    cleaned = 0
+    for folder_id, location in locations:
+        try:
+            sm.DeleteSMS(Folder=folder_id, Location=location)
+            cleaned += 1
+        except Exception as exc:
+            LOG.warning("❌ Failed to delete SMS at folder %s, location %s: %s", folder_id, location, exc)
 
     if cleaned > 0:
-        print(f"[CLEAN] SMS inbox cleaned ({cleaned} messages deleted)")
+        LOG.info("[CLEAN] SMS inbox cleaned (%s messages deleted)", cleaned)
     else:
-        print("[CLEAN] SMS inbox already empty")
+        LOG.info("[CLEAN] SMS inbox already empty")
     return True
 
-def print_usage():
-    print(f"""
+# Rendered once at import; printed by print_usage() and the option-error exits
+USAGE_TEXT = f"""
 SMS REST Service v{VERSION}
 
 Usage:
@@ -905,6 +1389,11 @@ Options:
     --uninstall              Uninstall service (removes systemd service, prompts for data/user removal)
     --create-htpasswd FILE USER [PASS]  Create/update htpasswd entry (prompts for PASS if omitted)
     --update-htpasswd FILE USER [PASS]  Alias for --create-htpasswd
+    --bcrypt-cost COST       bcrypt cost factor for --create-htpasswd (4-16 or 'auto', default: 10)
+    --batch PATH             With --create-htpasswd FILE: read user:password lines from PATH ('-' for stdin)
+    --check-config           Validate options and config, print the startup summary, and exit
+                             without opening the modem
+    --version                Show version and exit
     --help                   Show this help message
 
 Config File:
@@ -912,9 +1401,10 @@ Config File:
     Format: KEY=VALUE (shell-style)
     Supported keys: PORT, HTPASSWD_FILE, DEVICE, DEBUG,
                     SMS_REPLY_TIMEOUT, REPLY_POLL_INTERVAL,
-                    TIMEOUT_SWEEP_INTERVAL, QUEUE_WAIT_SECONDS,
-                    MESSAGE_RETENTION_SECONDS,
-                    GRAFANA_WEBHOOK, GRAFANA_DEFAULT_NUMBER,
+                    REPLY_POLL_MAX_INTERVAL, TIMEOUT_SWEEP_INTERVAL,
+                    QUEUE_WAIT_SECONDS, SEND_BATCH_SIZE,
+                    MESSAGE_RETENTION_SECONDS, SEND_QUEUE_MAX_SIZE, HTTP_THREADS,
+                    AUTH_CACHE_TTL, GRAFANA_WEBHOOK, GRAFANA_DEFAULT_NUMBER,
                     GRAFANA_MESSAGE_MAX_LENGTH
     Priority: CLI args > --config file > /etc/default/sms-rest-server > defaults
 
@@ -931,6 +1421,15 @@ Examples:
     # Update existing user (alias works the same way)
     sms-rest-server.py --update-htpasswd /var/lib/sms-rest-server/htpasswd admin
 
+    # Create htpasswd entry with a stronger bcrypt cost factor
+    sms-rest-server.py --bcrypt-cost 12 --create-htpasswd /var/lib/sms-rest-server/htpasswd admin
+
+    # Raise the cost above the default while a hash still takes under 50ms on this machine
+    sms-rest-server.py --bcrypt-cost auto --create-htpasswd /var/lib/sms-rest-server/htpasswd admin
+
+    # Create many htpasswd entries at once (hashed in parallel)
+    sms-rest-server.py --batch users.txt --create-htpasswd /var/lib/sms-rest-server/htpasswd
+
     # Install as system service
     sudo sms-rest-server.py --install
 
@@ -949,108 +1448,269 @@ API Usage:
          -u <user>:<password> \\
          -H "Content-Type: application/json" \\
          -d '{{"Number": "1234567890", "message": "Test", "reply": true, "timeout": 120}}'
-""")
+"""
 
-def create_htpasswd_entry(username, password):
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return f"{username}:{hashed.decode('utf-8')}"
+HTPASSWD_REQUIRED_ERROR = """Error: --htpasswd option is required (or set HTPASSWD_FILE in config)
 
-def create_htpasswd_file(username, password, output_file):
-    try:
-        entry = create_htpasswd_entry(username, password)
-
-        output_dir = os.path.dirname(output_file)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, mode=0o755, exist_ok=True)
-
-        lines = []
-        replaced = False
-        if os.path.exists(output_file):
-            with open(output_file, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    existing_user = line.split(':', 1)[0]
-                    if existing_user == username:
-                        lines.append(entry)
-                        replaced = True
-                    else:
-                        lines.append(line)
-        if not replaced:
-            lines.append(entry)
+You can:
+  1. Specify via CLI: --htpasswd /path/to/htpasswd
+  2. Set in config file: HTPASSWD_FILE=/path/to/htpasswd
+  3. Use default config: /etc/default/sms-rest-server
+"""
 
-        with open(output_file, 'w') as f:
-            for line in lines:
-                f.write(line + '\n')
+def print_usage(file=None):
+    print(USAGE_TEXT, file=file)
 
-        os.chmod(output_file, 0o600)
+CRYPT_DATA_SIZE = 32768
+# bcrypt only keys on the first 72 bytes; bcrypt.checkpw refuses longer passwords outright
+BCRYPT_MAX_PASSWORD_BYTES = 72
+_crypt_rn = None
+_crypt_rn_loaded = False
 
-        if '/var/lib/sms-rest-server' in output_file:
-            try:
-                import pwd
-                sms_user = pwd.getpwnam('sms-rest-server')
-                os.chown(output_file, sms_user.pw_uid, sms_user.pw_gid)
-                if replaced:
-                    print(f"✅ Updated htpasswd entry for '{username}' in {output_file} (ownership: sms-rest-server)")
-                else:
-                    print(f"✅ Added '{username}' to htpasswd file: {output_file} (ownership: sms-rest-server)")
-            except (KeyError, Exception) as e:
-                if replaced:
-                    print(f"✅ Updated htpasswd entry for '{username}' in {output_file}")
+def load_native_crypt_rn():
+    global _crypt_rn, _crypt_rn_loaded
+
+    if _crypt_rn_loaded:
+        return _crypt_rn
+    _crypt_rn_loaded = True
+
+    try:
+        import ctypes
+        import ctypes.util
+    except ImportError:
+        return None
+
+    # Openwall crypt_blowfish, or libxcrypt which ships the same optimized implementation
+    for name in ('crypt_blowfish', 'crypt'):
+        lib_path = ctypes.util.find_library(name)
+        if not lib_path:
+            continue
+        try:
+            crypt_rn = ctypes.CDLL(lib_path).crypt_rn
+        except (OSError, AttributeError):
+            continue
+        crypt_rn.restype = ctypes.c_char_p
+        crypt_rn.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_void_p, ctypes.c_int]
+        _crypt_rn = crypt_rn
+        if debug:
+            print(f"🔐 Using native crypt_rn from {lib_path} for bcrypt hashing")
+        break
+
+    return _crypt_rn
+
+def check_bcrypt_password_length(password_bytes):
+    # crypt_rn would silently hash the first 72 bytes, creating an entry verify_password can never accept
+    if len(password_bytes) > BCRYPT_MAX_PASSWORD_BYTES:
+        raise ValueError(f"password cannot be longer than {BCRYPT_MAX_PASSWORD_BYTES} bytes")
+
+def bcrypt_hash(password_bytes, setting):
+    check_bcrypt_password_length(password_bytes)
+    crypt_rn = load_native_crypt_rn()
+    if crypt_rn is not None and b'\x00' not in password_bytes:
+        import ctypes
+        data = ctypes.create_string_buffer(CRYPT_DATA_SIZE)
+        hashed = crypt_rn(password_bytes, setting, data, CRYPT_DATA_SIZE)
+        if hashed and hashed.startswith(setting[:7]):
+            return hashed
+    return bcrypt.hashpw(password_bytes, setting)
+
+BCRYPT_B64_TABLE = bytes.maketrans(
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/",
+    b"./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+)
+
+def _bcrypt_b64(raw):
+    # bcrypt uses standard base64 bit grouping with its own alphabet and no padding
+    return base64.b64encode(raw).rstrip(b"=").translate(BCRYPT_B64_TABLE)
+
+def calibrate_bcrypt_cost(target_seconds=BCRYPT_AUTO_TARGET_SECONDS, min_cost=BCRYPT_COST, max_cost=16):
+    # Time a hash at a cheap reference cost and extrapolate: each +1 doubles the work.
+    # One untimed hash first loads the native library, then the fastest of three runs is used
+    reference_cost = 8
+    bcrypt_hash(b"calibration", bcrypt_setting(4))
+    elapsed = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        bcrypt_hash(b"calibration", bcrypt_setting(reference_cost))
+        elapsed = min(elapsed, time.perf_counter() - started)
+    elapsed = max(elapsed, 1e-6)
+    cost = reference_cost + int(math.floor(math.log2(target_seconds / elapsed)))
+    return max(min_cost, min(max_cost, cost))
+
+def bcrypt_setting(cost=BCRYPT_COST):
+    return b"$2b$%02d$" % cost + _bcrypt_b64(os.urandom(16))
+
+def create_htpasswd_entry(username, password, cost=BCRYPT_COST):
+    # cost is the EksBlowfish work factor (log2 of key-schedule rounds); each +1 doubles hashing time
+    salt = bcrypt_setting(cost)
+    hashed = bcrypt_hash(password.encode('utf-8'), salt)
+    return username.encode('utf-8') + b":" + hashed + b"\n"
+
+def _hash_htpasswd_pair(item):
+    index, username, password, cost = item
+    return index, create_htpasswd_entry(username, password, cost)
+
+def hash_htpasswd_entries(pairs, cost=BCRYPT_COST):
+    # Validate every password before any hashing starts, so a batch fails without partial work
+    for username, password in pairs:
+        try:
+            check_bcrypt_password_length(password.encode('utf-8'))
+        except ValueError as e:
+            raise ValueError(f"user '{username}': {e}") from None
+
+    entries = [None] * len(pairs)
+    items = [(i, username, password, cost) for i, (username, password) in enumerate(pairs)]
+
+    if len(items) == 1:
+        entries[0] = create_htpasswd_entry(pairs[0][0], pairs[0][1], cost)
+    elif items:
+        import multiprocessing
+        workers = min(os.cpu_count() or 1, len(items))
+        chunksize = max(1, len(items) // (4 * workers))
+        with multiprocessing.Pool(workers) as pool:
+            for index, entry in pool.imap_unordered(_hash_htpasswd_pair, items, chunksize=chunksize):
+                entries[index] = entry
+
+    return entries
+
+def read_htpasswd_batch(batch_path):
+    pairs = []
+    if batch_path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(batch_path, 'r') as f:
+            lines = f.read().splitlines()
+
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if ':' not in line:
+            raise ValueError(f"line {line_number}: expected user:password")
+        username, password = line.split(':', 1)
+        if not username or not password:
+            raise ValueError(f"line {line_number}: username and password cannot be empty")
+        pairs.append((username, password))
+    return pairs
+
+def write_htpasswd_entries(output_file, entries):
+    output_dir = os.path.dirname(output_file)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir, mode=0o755, exist_ok=True)
+
+    encoded_entries = {username.encode('utf-8'): entry for username, entry in entries.items()}
+    lines = []
+    replaced = set()
+    if os.path.exists(output_file):
+        with open(output_file, 'rb') as f:
+            for line in f.read().splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                existing_user = line.partition(b':')[0]
+                if existing_user in encoded_entries:
+                    lines.append(encoded_entries[existing_user])
+                    replaced.add(existing_user)
                 else:
-                    print(f"✅ Added '{username}' to htpasswd file: {output_file}")
-                print(f"   ⚠️  Could not set ownership to sms-rest-server: {e}")
+                    lines.append(line + b"\n")
+    for username, entry in encoded_entries.items():
+        if username not in replaced:
+            lines.append(entry)
+
+    data = b"".join(lines)
+    fd = os.open(output_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        # Tighten an existing file's mode before any hash is written into it
+        os.fchmod(fd, 0o600)
+        written = os.write(fd, data)
+        while written < len(data):
+            written += os.write(fd, data[written:])
+    finally:
+        os.close(fd)
+
+    ownership_note = ""
+    ownership_error = None
+    if '/var/lib/sms-rest-server' in output_file:
+        try:
+            sms_user = pwd.getpwnam('sms-rest-server')
+            os.chown(output_file, sms_user.pw_uid, sms_user.pw_gid)
+            ownership_note = " (ownership: sms-rest-server)"
+        except (KeyError, Exception) as e:
+            ownership_error = e
+
+    for username in entries:
+        if username.encode('utf-8') in replaced:
+            print(f"✅ Updated htpasswd entry for '{username}' in {output_file}{ownership_note}")
         else:
-            if replaced:
-                print(f"✅ Updated htpasswd entry for '{username}' in {output_file}")
-            else:
-                print(f"✅ Added '{username}' to htpasswd file: {output_file}")
+            print(f"✅ Added '{username}' to htpasswd file: {output_file}{ownership_note}")
+    if ownership_error is not None:
+        print(f"   ⚠️  Could not set ownership to sms-rest-server: {ownership_error}")
 
-        return True
+    return True
+
+def create_htpasswd_file(username, password, output_file, cost=BCRYPT_COST):
+    try:
+        entry = hash_htpasswd_entries([(username, password)], cost)[0]
+        return write_htpasswd_entries(output_file, {username: entry})
+    except Exception as e:
+        print(f"❌ Error creating htpasswd file: {e}")
+        return False
+
+def create_htpasswd_batch(batch_path, output_file, cost=BCRYPT_COST):
+    try:
+        pairs = read_htpasswd_batch(batch_path)
+        if not pairs:
+            print(f"❌ No user:password entries found in {batch_path}")
+            return False
+
+        hashed = hash_htpasswd_entries(pairs, cost)
+        entries = {}
+        for (username, _), entry in zip(pairs, hashed):
+            entries[username] = entry
+        return write_htpasswd_entries(output_file, entries)
     except Exception as e:
         print(f"❌ Error creating htpasswd file: {e}")
         return False
 
 
 def prompt_for_password(username="user"):
+    # getpass prompts on the tty, so push out any block-buffered stdout first
+    sys.stdout.flush()
     while True:
-        pwd = getpass.getpass(f"Enter password for '{username}': ")
-        if not pwd:
+        password = getpass.getpass(f"Enter password for '{username}': ")
+        if not password:
             print("Password cannot be empty. Please try again.")
             continue
+        if len(password.encode('utf-8')) > BCRYPT_MAX_PASSWORD_BYTES:
+            print(f"Password cannot be longer than {BCRYPT_MAX_PASSWORD_BYTES} bytes. Please try again.")
+            continue
         confirm = getpass.getpass("Confirm password: ")
-        if pwd != confirm:
+        if password != confirm:
             print("Passwords do not match. Please try again.")
             continue
-        return pwd
+        return password
 
 def parse_config_file(config_path):
     config = {}
 
-    if not os.path.exists(config_path):
-        return config
-
     try:
         with open(config_path, 'r') as f:
-            for line in f:
-                line = line.strip()
+            data = f.read()
 
-                if not line or line.startswith('#'):
-                    continue
+        for line in data.splitlines():
+            line = line.strip()
+            if not line or line[0] == '#':
+                continue
 
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    key = key.strip()
-                    value = value.strip()
+            key, sep, value = line.partition('=')
+            if not sep:
+                continue
 
-                    if value.startswith('"') and value.endswith('"'):
-                        value = value[1:-1]
-                    elif value.startswith("'") and value.endswith("'"):
-                        value = value[1:-1]
+            value = value.strip()
+            if value[:1] in ('"', "'") and value.endswith(value[0]):
+                value = value[1:-1]
 
-                    config[key] = value
+            config[key.strip()] = value
 
         if debug:
             print(f"📄 Loaded config from: {config_path}")
@@ -1058,52 +1718,91 @@ def parse_config_file(config_path):
                 print(f"   {key}={value}")
 
         return config
+    except FileNotFoundError:
+        return None
     except Exception as e:
         print(f"⚠️  Error reading config file {config_path}: {e}")
         return {}
 
 def load_config():
+    # Read once by main(); returns (settings, path that was read) with path None when no
+    # config file exists, so callers never need to stat the file again
     global config_file
 
-    if config_file and os.path.exists(config_file):
-        return parse_config_file(config_file)
+    if config_file:
+        config = parse_config_file(config_file)
+        if config is not None:
+            return config, config_file
 
-    default_config = '/etc/default/sms-rest-server'
-    if os.path.exists(default_config):
-        return parse_config_file(default_config)
+    config = parse_config_file('/etc/default/sms-rest-server')
+    if config is None:
+        return {}, None
+    return config, '/etc/default/sms-rest-server'
 
-    return {}
 
+def validate_path(path, kind, device=False):
+    # One stat per path with a specific reason, rather than exists() now and an open() failure later
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return f"{kind} not found: {path}"
+    except OSError as e:
+        return f"cannot access {kind} {path}: {e.strerror}"
+
+    if device:
+        if not stat.S_ISCHR(st.st_mode):
+            return f"{kind} is not a character device: {path}"
+        if not os.access(path, os.R_OK | os.W_OK):
+            return f"no read/write permission on {kind} {path} (is the user in the dialout group?)"
+    elif not stat.S_ISREG(st.st_mode):
+        return f"{kind} is not a regular file: {path}"
+    elif not os.access(path, os.R_OK):
+        return f"no read permission on {kind} {path}"
+    return None
+
+TRUE_CONFIG_VALUES = frozenset(('1', 'true', 'yes', 'on', 'enabled'))
+FALSE_CONFIG_VALUES = frozenset(('0', 'false', 'no', 'off', 'disabled'))
 
 def get_int_config(config, key, current_value, min_value=None, max_value=None):
     if key not in config:
         return current_value
 
     raw_value = config[key]
-    try:
+    # Plain digit strings (the usual case) skip int()'s exception path entirely
+    if raw_value.isdecimal():
         value = int(raw_value)
-        if min_value is not None and value < min_value:
-            raise ValueError
-        if max_value is not None and value > max_value:
-            raise ValueError
-        return value
-    except ValueError:
+    else:
+        try:
+            value = int(raw_value)
+        except ValueError:
+            value = None
+
+    if (value is None
+            or (min_value is not None and value < min_value)
+            or (max_value is not None and value > max_value)):
         print(f"Warning: Invalid value for {key} in config ({raw_value}), keeping {current_value}")
         return current_value
+    return value
 
 def get_bool_config(config, key, current_value):
     if key not in config:
         return current_value
 
     raw_value = config[key].lower().strip()
-    if raw_value in ['1', 'true', 'yes', 'on', 'enabled']:
+    if raw_value in TRUE_CONFIG_VALUES:
         return True
-    elif raw_value in ['0', 'false', 'no', 'off', 'disabled']:
+    elif raw_value in FALSE_CONFIG_VALUES:
         return False
     else:
         print(f"Warning: Invalid boolean value for {key} in config ({raw_value}), keeping {current_value}")
         return current_value
 
+def get_str_config(config, key, current_value):
+    if key not in config:
+        return current_value
+
+    return config[key].strip() or None
+
 def parse_existing_config(config_path):
     settings = {}
     if not os.path.exists(config_path):
@@ -1153,55 +1852,136 @@ def merge_config_with_template(old_settings, template):
 
     return '\n'.join(merged_lines)
 
+def list_serial_ports():
+    # One directory read instead of a stat per candidate; ports sort by prefix
+    # and then in numeric order (ttyUSB2 < ttyUSB10)
+    try:
+        devices = os.listdir('/dev')
+    except OSError:
+        return []
+
+    ports = []
+    for device in devices:
+        for rank, prefix in enumerate(SERIAL_PORT_PREFIXES):
+            suffix = device[len(prefix):]
+            if device.startswith(prefix) and suffix.isdigit():
+                ports.append((rank, int(suffix), f"/dev/{device}"))
+                break
+    return [port for _, _, port in sorted(ports)]
+
+def read_sysfs_attr(path, name):
+    with open(os.path.join(path, name), 'r') as f:
+        return f.read().strip()
+
+def usb_interface_id(port):
+    # "vendor:product:interface" of the USB function behind a tty node, or None if it is not USB.
+    # ttyUSB nodes sit one level below their interface directory, ttyACM nodes are the interface itself
+    path = os.path.realpath(f"/sys/class/tty/{os.path.basename(port)}/device")
+    for _ in range(2):
+        if os.path.exists(os.path.join(path, 'bInterfaceNumber')):
+            try:
+                usb_device = os.path.dirname(path)
+                return ':'.join((read_sysfs_attr(usb_device, 'idVendor'),
+                                 read_sysfs_attr(usb_device, 'idProduct'),
+                                 read_sysfs_attr(path, 'bInterfaceNumber')))
+            except OSError:
+                return None
+        path = os.path.dirname(path)
+    return None
+
+def load_last_modem():
+    try:
+        with open(os.path.expanduser(LAST_MODEM_FILE), 'r') as f:
+            record = json.load(f)
+        return record if isinstance(record, dict) else None
+    except Exception:
+        return None
+
+def remember_modem(port, manufacturer):
+    record = {'device': port, 'manufacturer': manufacturer, 'usb_id': usb_interface_id(port)}
+    if load_last_modem() == record:
+        return
+    try:
+        write_install_file(os.path.expanduser(LAST_MODEM_FILE), json.dumps(record) + "\n")
+    except Exception as e:
+        LOG.debug("Failed to save last modem: %s", e)
+
+def find_remembered_modem_port(ports):
+    # The same USB modem may come back under another ttyUSB number after a replug or reboot
+    last = load_last_modem()
+    if not last or last.get('device') is None:
+        return None
+    device, usb_id = last['device'], last.get('usb_id')
+    if usb_id is None:
+        return device if device in ports else None
+    if device in ports and usb_interface_id(device) == usb_id:
+        return device
+    for port in ports:
+        if port != device and usb_interface_id(port) == usb_id:
+            return port
+    return None
+
 def detect_modem_port():
-    print("🔍 Auto-detecting modem port...")
+    LOG.info("🔍 Auto-detecting modem port...")
 
-    usb_ports = []
-    for i in range(10):
-        port = f'/dev/ttyUSB{i}'
-        if os.path.exists(port):
-            usb_ports.append(port)
+    usb_ports = list_serial_ports()
 
     if not usb_ports:
         return False, None, "No USB serial ports found"
 
-    print(f"🔍 Scanning USB ports: {', '.join(usb_ports)}")
-
-    # Test each port
+    remembered = find_remembered_modem_port(usb_ports)
+    if remembered:
+        detected, detail = probe_modem_port(remembered)
+        if detected:
+            LOG.info("   Testing %s (last used modem)... ✅ Modem detected! (%s)", remembered, detail)
+            return True, remembered, detail
+        LOG.info("   Testing %s (last used modem)... ❌ %s", remembered, detail)
+        usb_ports = [port for port in usb_ports if port != remembered]
+        if not usb_ports:
+            return False, None, "No modem found on any USB port"
+
+    LOG.info("🔍 Scanning USB ports: %s", ', '.join(usb_ports))
+
+    # One port at a time, stopping at the first responder: no other device gets opened or sent
+    # AT, and no probe is left holding a port open while gammu initializes
     for port in usb_ports:
-        print(f"   Testing {port}...", end=" ")
+        detected, detail = probe_modem_port(port)
+        if detected:
+            LOG.info("   Testing %s... ✅ Modem detected! (%s)", port, detail)
+            return True, port, detail
+        LOG.info("   Testing %s... ❌ %s", port, detail)
 
-        try:
-            # Try basic AT command
-            with serial.Serial(port, 115200, timeout=2) as ser:
-                ser.write(b'AT\r\n')
-                time.sleep(0.5)
-                response = ser.read(ser.in_waiting).decode('utf-8', errors='ignore')
-
-                if 'OK' in response:
-                    # Try to get manufacturer
-                    ser.write(b'AT+CGMI\r\n')
-                    time.sleep(0.5)
-                    manu_response = ser.read(ser.in_waiting).decode('utf-8', errors='ignore')
-
-                    # Extract manufacturer name
-                    manufacturer = "Unknown"
-                    for line in manu_response.split('\n'):
-                        line = line.strip()
-                        if line and line not in ['AT+CGMI', 'OK', '']:
-                            manufacturer = line
-                            break
-
-                    print(f"✅ Modem detected! ({manufacturer})")
-                    return True, port, manufacturer
-                else:
-                    print("❌ No response")
+    return False, None, "No modem found on any USB port"
 
-        except Exception as e:
-            print(f"❌ Error: {e}")
-            continue
 
-    return False, None, "No modem found on any USB port"
+def probe_modem_port(port):
+    # pyserial is only needed for port auto-detection, so it is not imported at startup
+    import serial
+
+    try:
+        # Try basic AT command
+        with serial.Serial(port, 115200, timeout=2) as ser:
+            ser.write(b'AT\r\n')
+            # Only the manufacturer reply needs text; the AT probe is checked as raw bytes
+            if b'OK' not in ser.read_until(b'OK\r\n', AT_RESPONSE_MAX_BYTES):
+                return False, "No response"
+
+            # Try to get manufacturer
+            ser.write(b'AT+CGMI\r\n')
+            manu_response = ser.read_until(b'OK\r\n', AT_RESPONSE_MAX_BYTES).decode('utf-8', errors='ignore')
+
+            # Extract manufacturer name
+            manufacturer = "Unknown"
+            for line in manu_response.split('\n'):
+                line = line.strip()
+                if line and line not in ['AT+CGMI', 'OK', '']:
+                    manufacturer = line
+                    break
+
+            return True, manufacturer
+
+    except Exception as e:
+        return False, f"Error: {e}"
 
 def update_gammu_config(port):
     gammu_config = f"""[gammu]
@@ -1220,93 +2000,77 @@ gammuloc =
 
         if os.path.exists(config_path):
             backup_path = f"{config_path}.bkp-{time.strftime('%Y%m%d%H%M%S')}"
-            import shutil
             shutil.copy2(config_path, backup_path)
-            if debug:
-                print(f"📋 Backed up existing config to: {backup_path}")
+            LOG.debug("📋 Backed up existing config to: %s", backup_path)
 
         # Write new config
         with open(config_path, 'w') as f:
             f.write(gammu_config)
+        gammurc_port_cache[config_path] = port
 
-        if debug:
-            print(f"📝 Updated ~/.gammurc to use port: {port}")
+        LOG.debug("📝 Updated ~/.gammurc to use port: %s", port)
         return True
 
     except Exception as e:
-        print(f"❌ Failed to update gammu config: {e}")
+        LOG.warning("❌ Failed to update gammu config: %s", e)
         return False
 
 def test_gammu_config():
     try:
-        sm = gammu.StateMachine()
+        sm = load_gammu().StateMachine()
         sm.ReadConfig()
         sm.Init()
 
         info = sm.GetManufacturer()
-        sm.Terminate()
 
-        return True, f"✅ Gammu config test successful (Manufacturer: {info})"
+        return True, f"✅ Gammu config test successful (Manufacturer: {info})", sm
 
     except gammu.ERR_DEVICENOTEXIST as e:
-        return False, f"Device not found: {e}"
+        return False, f"Device not found: {e}", None
     except gammu.ERR_DEVICENOPERMISSION as e:
-        return False, f"Permission denied: {e}. Try running with sudo or add user to dialout group"
+        return False, f"Permission denied: {e}. Try running with sudo or add user to dialout group", None
     except gammu.ERR_DEVICEOPENERROR as e:
-        return False, f"Device open error: {e}"
+        return False, f"Device open error: {e}", None
     except Exception as e:
-        return False, f"Gammu config test failed: {e}"
+        return False, f"Gammu config test failed: {e}", None
 
 def init_modem_intelligent():
     global modem_device
 
     if modem_device:
         if not os.path.exists(modem_device):
-            print(f"[MODEM] Specified device does not exist: {modem_device}")
+            LOG.warning("[MODEM] Specified device does not exist: %s", modem_device)
             return None
 
         existing_port = read_port_from_gammurc()
         if existing_port == modem_device:
-            config_valid, manufacturer = test_existing_gammu_config()
+            config_valid, manufacturer, sm = test_existing_gammu_config()
 
             if config_valid:
-                sm = gammu.StateMachine()
-                sm.ReadConfig()
-                sm.Init()
                 manufacturer_info = f" ({manufacturer})" if manufacturer else ""
-                print(f"[MODEM] Using existing config: {modem_device}{manufacturer_info}")
+                LOG.info("[MODEM] Using existing config: %s%s", modem_device, manufacturer_info)
                 return sm
 
         if not update_gammu_config(modem_device):
             return None
 
-        test_success, test_message = test_gammu_config()
+        test_success, test_message, sm = test_gammu_config()
         if not test_success:
-            print(f"[MODEM] Config test failed for {modem_device}: {test_message}")
+            LOG.warning("[MODEM] Config test failed for %s: %s", modem_device, test_message)
             return None
 
-        # Initialize modem
-        try:
-            sm = gammu.StateMachine()
-            sm.ReadConfig()
-            sm.Init()
-            print(f"[MODEM] Initialized on {modem_device}")
-            return sm
-        except Exception as e:
-            print(f"[MODEM] Failed to initialize on {modem_device}: {e}")
-            return None
+        LOG.info("[MODEM] Initialized on %s", modem_device)
+        return sm
 
     existing_port = read_port_from_gammurc()
 
     if existing_port:
-        config_valid, manufacturer = test_existing_gammu_config()
+        config_valid, manufacturer, sm = test_existing_gammu_config()
 
         if config_valid:
-            sm = gammu.StateMachine()
-            sm.ReadConfig()
-            sm.Init()
             manufacturer_info = f" ({manufacturer})" if manufacturer else ""
-            print(f"[MODEM] Using existing config: {existing_port}{manufacturer_info}")
+            LOG.info("[MODEM] Using existing config: %s%s", existing_port, manufacturer_info)
+            remember_modem(existing_port, manufacturer)
             return sm
 
     mm_stopped = False
@@ -1314,12 +2078,12 @@ def init_modem_intelligent():
         if stop_modem_manager():
             mm_stopped = True
         else:
-            print("[MODEM] Failed to stop ModemManager")
+            LOG.warning("[MODEM] Failed to stop ModemManager")
             return None
 
     detect_success, port, manufacturer = detect_modem_port()
     if not detect_success:
-        print(f"[MODEM] Detection failed: {manufacturer}")
+        LOG.warning("[MODEM] Detection failed: %s", manufacturer)
         if mm_stopped:
             start_modem_manager()
         return None
@@ -1329,29 +2093,23 @@ def init_modem_intelligent():
             start_modem_manager()
         return None
 
-    test_success, test_message = test_gammu_config()
+    test_success, test_message, sm = test_gammu_config()
     if not test_success:
-        print(f"[MODEM] Config test failed: {test_message}")
+        LOG.warning("[MODEM] Config test failed: %s", test_message)
         if mm_stopped:
             start_modem_manager()
         return None
 
-    try:
-        sm = gammu.StateMachine()
-        sm.ReadConfig()
-        sm.Init()
-        print(f"[MODEM] Initialized on {port} ({manufacturer})")
-        return sm
-    except Exception as e:
-        print(f"[MODEM] Failed to initialize: {e}")
-        if mm_stopped:
-            start_modem_manager()
-        return None
+    LOG.info("[MODEM] Initialized on %s (%s)", port, manufacturer)
+    remember_modem(port, manufacturer)
+    return sm
 
 def init_modem():
     return init_modem_intelligent()
 
+@functools.lru_cache(maxsize=None)
 def check_modemmanager_exists():
+    # Whether the unit is installed does not change while the server runs
     try:
         result = subprocess.run(['systemctl', 'list-units', '--all', 'ModemManager.service'],
                               capture_output=True, text=True, timeout=5)
@@ -1359,165 +2117,160 @@ def check_modemmanager_exists():
     except Exception:
         return False
 
-def is_modemmanager_running():
+def is_modemmanager_running(max_age=MODEMMANAGER_STATE_TTL):
+    # Reuses a systemctl answer younger than max_age seconds; pass 0 to force a fresh check
+    now = time.monotonic()
+    checked_at = modemmanager_state_cache['checked_at']
+    if checked_at is not None and now - checked_at < max_age:
+        return modemmanager_state_cache['running']
+
     try:
         result = subprocess.run(['systemctl', 'is-active', 'ModemManager.service'],
                               capture_output=True, text=True, timeout=5)
-        return result.stdout.strip() == 'active'
+        running = result.stdout.strip() == 'active'
     except Exception:
-        return False
+        running = False
+    modemmanager_state_cache['running'] = running
+    modemmanager_state_cache['checked_at'] = now
+    return running
+
+def wait_for_modemmanager_state(running, attempts=20, interval=0.1):
+    # Replaces a fixed 2 s sleep; returns as soon as systemd reports the new state
+    for _ in range(attempts):
+        if is_modemmanager_running(max_age=0) == running:
+            return True
+        time.sleep(interval)
+    return False
 
 def stop_modem_manager():
     if not check_modemmanager_exists():
-        if debug:
-            print("ModemManager service does not exist, skipping stop")
+        LOG.debug("ModemManager service does not exist, skipping stop")
         return True
 
     if not is_modemmanager_running():
-        if debug:
-            print("ModemManager service is not running, skipping stop")
+        LOG.debug("ModemManager service is not running, skipping stop")
         return True
 
     try:
-        if debug:
-            print("Stopping ModemManager service...")
-        result = subprocess.run(['sudo', 'systemctl', 'stop', 'ModemManager.service'],
-                              capture_output=True, text=True, timeout=10)
-        time.sleep(2)
-        if debug:
-            print("ModemManager service stopped successfully")
+        LOG.debug("Stopping ModemManager service...")
+        subprocess.run(['sudo', 'systemctl', 'stop', 'ModemManager.service'],
+                       stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, timeout=10, check=False)
+        wait_for_modemmanager_state(running=False)
+        LOG.debug("ModemManager service stopped successfully")
         return True
     except Exception as e:
-        if debug:
-            print(f"Failed to stop ModemManager: {e}")
+        LOG.debug("Failed to stop ModemManager: %s", e)
         return False
 
 def start_modem_manager():
     if not check_modemmanager_exists():
-        if debug:
-            print("ModemManager service does not exist, skipping start")
+        LOG.debug("ModemManager service does not exist, skipping start")
         return True
 
     try:
-        if debug:
-            print("Starting ModemManager service...")
-        result = subprocess.run(['sudo', 'systemctl', 'start', 'ModemManager.service'],
-                              capture_output=True, text=True, timeout=10)
-        time.sleep(2)
-        if debug:
-            print("ModemManager service started successfully")
+        LOG.debug("Starting ModemManager service...")
+        subprocess.run(['sudo', 'systemctl', 'start', 'ModemManager.service'],
+                       stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, timeout=10, check=False)
+        wait_for_modemmanager_state(running=True)
+        LOG.debug("ModemManager service started successfully")
         return True
     except Exception as e:
-        if debug:
-            print(f"Failed to start ModemManager: {e}")
+        LOG.debug("Failed to start ModemManager: %s", e)
         return False
 
-def send_sms(sm, phone_number, message, sender_user=None, source_ip=None, reply_expected=False, message_id=None):
-    timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-    msg_id_display = message_id if message_id else "no-msg-id"
-
+def send_sms(sm, phone_number, message, sender_user=None, source_ip=None, reply_expected=False, message_id=None,
+             smsc=None):
     try:
         sms_info = {
             'Text': message,
-            'SMSC': {'Location': 1},
+            'SMSC': smsc or {'Location': 1},
             'Number': phone_number
         }
 
-        result = sm.SendSMS(sms_info)
-
-        sender_info = f"{sender_user or 'system'} ({source_ip})" if source_ip else (sender_user or 'system')
-
-        reply_status = " (reply expected)" if reply_expected else ""
-        message_preview = f"'{message[:50]}{'...' if len(message) > 50 else ''}'"
-        print(f"[SMS] {timestamp} | {msg_id_display} | {sender_info} → {phone_number} | SUCCESS{reply_status} | {message_preview}")
-
-        return True, "success", "SMS sent successfully"
+        sm.SendSMS(sms_info)
+        outcome, status, details = 'SUCCESS', "success", "SMS sent successfully"
 
     except gammu.ERR_TIMEOUT as e:
-        error_msg = f"Timeout while sending SMS to {phone_number}: {str(e)}"
-
-        sender_info = f"{sender_user or 'system'} ({source_ip})" if source_ip else (sender_user or 'system')
-
-        reply_status = " (reply expected)" if reply_expected else ""
-        message_preview = f"'{message[:50]}{'...' if len(message) > 50 else ''}'"
-        print(f"[SMS] {timestamp} | {msg_id_display} | {sender_info} → {phone_number} | TIMEOUT{reply_status} | {message_preview}")
-
-        return False, "timeout", error_msg
+        outcome, status, details = 'TIMEOUT', "timeout", f"Timeout while sending SMS to {phone_number}: {e}"
 
     except gammu.ERR_DEVICENOTEXIST as e:
-        error_msg = f"Device not found while sending SMS to {phone_number}: {str(e)}"
-
-        sender_info = f"{sender_user or 'system'} ({source_ip})" if source_ip else (sender_user or 'system')
-
-        reply_status = " (reply expected)" if reply_expected else ""
-        message_preview = f"'{message[:50]}{'...' if len(message) > 50 else ''}'"
-        print(f"[SMS] {timestamp} | {msg_id_display} | {sender_info} → {phone_number} | DEVICE_ERROR{reply_status} | {message_preview}")
-
-        return False, "device_error", error_msg
+        outcome, status, details = ('DEVICE_ERROR', "device_error",
+                                    f"Device not found while sending SMS to {phone_number}: {e}")
 
     except gammu.ERR_DEVICENOPERMISSION as e:
-        error_msg = f"Permission denied while sending SMS to {phone_number}: {str(e)}"
-
-        sender_info = f"{sender_user or 'system'} ({source_ip})" if source_ip else (sender_user or 'system')
-
-        reply_status = " (reply expected)" if reply_expected else ""
-        message_preview = f"'{message[:50]}{'...' if len(message) > 50 else ''}'"
-        print(f"[SMS] {timestamp} | {msg_id_display} | {sender_info} → {phone_number} | PERMISSION_ERROR{reply_status} | {message_preview}")
-
-        return False, "permission_error", error_msg
+        outcome, status, details = ('PERMISSION_ERROR', "permission_error",
+                                    f"Permission denied while sending SMS to {phone_number}: {e}")
 
     except Exception as e:
-        error_msg = f"Failed to send SMS to {phone_number}: {str(e)}"
-
-        sender_info = f"{sender_user or 'system'} ({source_ip})" if source_ip else (sender_user or 'system')
+        outcome, status, details = 'ERROR', "failed", f"Failed to send SMS to {phone_number}: {e}"
 
-        reply_status = " (reply expected)" if reply_expected else ""
-        message_preview = f"'{message[:50]}{'...' if len(message) > 50 else ''}'"
-        print(f"[SMS] {timestamp} | {msg_id_display} | {sender_info} → {phone_number} | ERROR{reply_status} | {message_preview}")
+    level = logging.INFO if status == "success" else logging.WARNING
+    if LOG.isEnabledFor(level):
+        LOG.log(level, SMS_LOG_FORMAT,
+                time.strftime('%Y-%m-%d %H:%M:%S'), message_id or "no-msg-id",
+                sender_user or 'system', f" ({source_ip})" if source_ip else "", phone_number,
+                outcome, " (reply expected)" if reply_expected else "",
+                message[:50], '...' if len(message) > 50 else '')
 
-        return False, "failed", error_msg
+    return status == "success", status, details
 
 def validate_and_normalize_phone(phone_number):
-    if str(phone_number) in OPERATOR_SERVICE_NUMBERS:
-        return True, str(phone_number), None
+    phone_number = str(phone_number)
+    if phone_number in OPERATOR_SERVICE_NUMBERS:
+        return True, phone_number, None
 
-    clean = str(phone_number).replace(' ', '').replace('-', '')
+    clean = phone_number.translate(PHONE_SEPARATORS_TABLE)
 
     if clean.startswith('+'):
-        if re.match(r'^\+\d{1,3}\d{4,14}$', clean):
+        digits = clean[1:]
+        if digits.isdecimal() and E164_MIN_DIGITS <= len(digits) <= E164_MAX_DIGITS:
             return True, clean, None
         else:
             return False, None, 'Invalid E.164 format (use +{country_code}{number})'
 
-    if re.match(r'^\d{10}$', clean):
-        return True, f"{LOCAL_COUNTRY_CODE}{clean}", None
-
-    if re.match(r'^\d{11,}$', clean):
-        return False, None, 'Ambiguous format (use +{country_code}{number} for international numbers)'
+    if clean.isdecimal():
+        if len(clean) == LOCAL_NUMBER_DIGITS:
+            return True, LOCAL_COUNTRY_CODE + clean, None
+        if len(clean) > LOCAL_NUMBER_DIGITS:
+            return False, None, 'Ambiguous format (use +{country_code}{number} for international numbers)'
 
     return False, None, 'Invalid phone number format (use 10 digits or +{country_code}{number})'
 
+def parse_reply_timeout(value):
+    # Predicate checks instead of int() + except: bad input is common on this path
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    if isinstance(value, str):
+        text = value.strip()
+        digits = text[1:] if text[:1] in ('+', '-') else text
+        return int(text) if digits.isdecimal() else None
+    return None
+
 def normalize_phone_number(phone_number):
+    return _normalize_phone_cached(str(phone_number))
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_phone_cached(phone_number):
     valid, normalized, error = validate_and_normalize_phone(phone_number)
 
     if valid:
         return normalized
     else:
-        return str(phone_number)
-
-def phone_numbers_match(number1, number2):
-    norm1 = normalize_phone_number(number1)
-    norm2 = normalize_phone_number(number2)
+        return phone_number
 
-    if debug:
-        print(f"🔍 Number matching: '{number1}' -> '{norm1}' vs '{number2}' -> '{norm2}'")
+def get_sms_with_locations(sm, status=None):
+    return list(iter_sms_with_locations(sm, status))
 
-    return norm1 == norm2
-
-def get_sms_with_locations(sm):
-    response = []
+def iter_sms_with_locations(sm, status=None):
     try:
-        status = sm.GetSMSStatus()
+        if status is None:
+            status = sm.GetSMSStatus()
         remain = status["SIMUsed"] + status["PhoneUsed"] + status["TemplatesUsed"]
         start = True
         while remain > 0:
@@ -1528,78 +2281,152 @@ def get_sms_with_locations(sm):
                 sms = sm.GetNextSMS(Location=sms[0]["Location"], Folder=0)
             remain = remain - len(sms)
             for m in sms:
-                response.append({
+                yield {
                     "Number": m['Number'],
                     "DateTime": m.get('DateTime'),
                     "State": m.get('State'),
                     "Text": m['Text'],
                     "Location": m['Location']
-                })
+                }
     except gammu.ERR_EMPTY:
         pass
-    return response
 
-def load_htpasswd_users(htpasswd_path):
+def parse_htpasswd_users(data):
     users = {}
-    try:
-        with open(htpasswd_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and ':' in line:
-                    username, password_hash = line.split(':', 1)
-                    users[username] = password_hash
-    except Exception as e:
-        print(f"Error loading htpasswd file: {e}")
+    for line in data.splitlines():
+        username, sep, password_hash = line.strip().partition(':')
+        if sep:
+            users[username] = password_hash
     return users
 
+def get_htpasswd_users(htpasswd_path):
+    # Stat the path, not a kept descriptor: a file renamed aside (mv, editor backups) and replaced
+    # by a new one must be picked up, which only a path lookup sees
+    try:
+        st = os.stat(htpasswd_path)
+        stamp = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError as e:
+        stamp = None
+        error = e
+
+    with htpasswd_users_lock:
+        if htpasswd_users_cache['path'] == htpasswd_path and htpasswd_users_cache['stamp'] == stamp:
+            return htpasswd_users_cache['users']
+        if stamp is None:
+            # Warn once per outage rather than on every request
+            LOG.warning("Error loading htpasswd file: %s", error)
+            users = {}
+        else:
+            try:
+                with open(htpasswd_path, 'r', encoding='utf-8') as f:
+                    users = parse_htpasswd_users(f.read())
+            except (OSError, UnicodeDecodeError) as e:
+                LOG.warning("Error loading htpasswd file: %s", e)
+                users = {}
+        htpasswd_users_cache.update(path=htpasswd_path, stamp=stamp, users=users,
+                                    dummy_cost=max_bcrypt_cost(users))
+        return users
+
+def verify_password_cached(stored_hash, password):
+    if AUTH_CACHE_TTL <= 0:
+        return verify_password(stored_hash, password)
+
+    password_digest = hmac.new(AUTH_CACHE_KEY, password.encode('utf-8'), hashlib.sha256).digest()
+    cache_key = (stored_hash, password_digest)
+    now = time.monotonic()
+    with auth_cache_lock:
+        cached = auth_cache.pop(cache_key, None)
+        if cached and cached[1] > now:
+            # Re-insert so dict order tracks recency and eviction drops the least recently used entry
+            auth_cache[cache_key] = cached
+            return cached[0]
+
+    result = verify_password(stored_hash, password)
+
+    with auth_cache_lock:
+        auth_cache.pop(cache_key, None)
+        while auth_cache and len(auth_cache) >= AUTH_CACHE_MAX_ENTRIES:
+            del auth_cache[next(iter(auth_cache))]
+        auth_cache[cache_key] = (result, now + AUTH_CACHE_TTL)
+    return result
+
+def max_bcrypt_cost(users):
+    # Highest work factor among the loaded bcrypt entries ($2b$12$... -> 12), or BCRYPT_COST if none
+    costs = [int(h[4:6]) for h in users.values()
+             if h.startswith(('$2b$', '$2a$', '$2y$')) and h[4:6].isdigit()]
+    return max(costs, default=BCRYPT_COST)
+
+@functools.lru_cache(maxsize=None)
+def dummy_password_hash(cost=BCRYPT_COST):
+    # Hashed on the first unknown username at the htpasswd file's highest cost, so a miss costs
+    # as much as checking the slowest real entry
+    return bcrypt_hash(b"sms-rest-server", bcrypt_setting(cost)).decode('ascii')
+
 def verify_password(stored_hash, password):
     try:
-        if stored_hash.startswith('$2b$') or stored_hash.startswith('$2a$') or stored_hash.startswith('$2y$'):
+        if stored_hash.startswith(('$2b$', '$2a$', '$2y$')):
             return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
         else:
+            from werkzeug.security import check_password_hash
             return check_password_hash(stored_hash, password)
     except Exception as e:
-        if debug:
-            print(f"Password verification error: {e}")
+        LOG.debug("Password verification error: %s", e)
         return False
 
 def initialize_global_modem():
     global global_modem
 
-    print("[MODEM] Initializing connection...")
+    LOG.info("[MODEM] Initializing connection...")
     global_modem = init_modem_intelligent()
 
     if not global_modem:
-        print("[MODEM] Failed to establish connection")
+        LOG.warning("[MODEM] Failed to establish connection")
         return False
+    mark_modem_alive()
 
-    print("[CLEAN] Clearing SMS inbox...")
+    LOG.info("[CLEAN] Clearing SMS inbox...")
     if not clear_inbox_with_gammu(global_modem):
-        print("[CLEAN] Inbox cleanup failed, continuing...")
+        LOG.warning("[CLEAN] Inbox cleanup failed, continuing...")
 
-    print("[MODEM] Connection established")
+    LOG.info("[MODEM] Connection established")
     return True
 
+def mark_modem_alive():
+    global modem_last_ok
+    modem_last_ok = time.monotonic()
+
+def mark_modem_suspect():
+    global modem_last_ok
+    modem_last_ok = None
+
 def get_modem_connection():
     global global_modem
 
     if global_modem is None:
-        if debug:
-            print("🔄 Global modem is None, attempting to initialize...")
+        LOG.debug("🔄 Global modem is None, attempting to initialize...")
         global_modem = init_modem_intelligent()
+        if global_modem:
+            mark_modem_alive()
+        return global_modem
+
+    # A recently working connection is returned without an AT round-trip;
+    # a failed send marks it suspect so the next call probes again
+    if modem_last_ok is not None and time.monotonic() - modem_last_ok < MODEM_PROBE_INTERVAL:
+        return global_modem
 
-    if global_modem:
+    try:
+        global_modem.GetManufacturer()
+        mark_modem_alive()
+        return global_modem
+    except Exception as e:
+        LOG.debug("🔄 Modem connection lost (%s), attempting to reconnect...", e)
         try:
-            global_modem.GetManufacturer()
-            return global_modem
-        except Exception as e:
-            if debug:
-                print(f"🔄 Modem connection lost ({e}), attempting to reconnect...")
-            try:
-                global_modem.Terminate()
-            except:
-                pass
-            global_modem = init_modem_intelligent()
+            global_modem.Terminate()
+        except:
+            pass
+        global_modem = init_modem_intelligent()
+        if global_modem:
+            mark_modem_alive()
 
     return global_modem
 
@@ -1626,10 +2453,10 @@ def check_prerequisites():
 
     missing_packages = []
     for module_name, package_name in required_packages:
-        try:
-            __import__(module_name)
+        # find_spec only locates the package; importing Flask here would load werkzeug and Jinja2 for nothing
+        if importlib.util.find_spec(module_name) is not None:
             print(f"   ✅ {package_name} is installed")
-        except ImportError:
+        else:
             missing_packages.append(package_name)
             issues.append(f"Missing Python package: {package_name}")
 
@@ -1650,11 +2477,8 @@ def check_prerequisites():
     if os.path.exists('/etc/systemd/system/sms-rest-server.service'):
         warnings.append("Previous systemd service file detected")
 
-    usb_devices = []
     try:
-        for device in os.listdir('/dev'):
-            if device.startswith('ttyUSB'):
-                usb_devices.append(f"/dev/{device}")
+        usb_devices = list_serial_ports()
 
         if usb_devices:
             print(f"   ✅ USB serial devices found: {', '.join(usb_devices)}")
@@ -1665,7 +2489,6 @@ def check_prerequisites():
 
     # 8. Check dialout group membership (for current user)
     try:
-        import pwd, grp
         current_user = pwd.getpwuid(os.getuid()).pw_name if os.getuid() != 0 else "root"
         try:
             dialout_group = grp.getgrnam('dialout')
@@ -1682,8 +2505,8 @@ def check_prerequisites():
 
     # 9. Check disk space
     try:
-        stat = os.statvfs('/usr/local/bin')
-        free_space_mb = (stat.f_bavail * stat.f_frsize) / (1024 * 1024)
+        fs_stat = os.statvfs('/usr/local/bin')
+        free_space_mb = (fs_stat.f_bavail * fs_stat.f_frsize) / (1024 * 1024)
         if free_space_mb < 10:
             issues.append(f"Insufficient disk space in /usr/local/bin ({free_space_mb:.1f}MB available, 10MB required)")
         else:
@@ -1692,17 +2515,17 @@ def check_prerequisites():
         warnings.append("Cannot check disk space")
 
     # 10. Check network port availability
+    # A bind is one local syscall; SO_REUSEADDR keeps lingering TIME_WAIT sockets from counting as "in use"
     try:
-        import socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        result = sock.connect_ex(('localhost', 18180))
-        sock.close()
-        if result == 0:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(('', 18180))
+        print("   ✅ Port 18180 is available")
+    except OSError as e:
+        if e.errno == errno.EADDRINUSE:
             warnings.append("Port 18180 is already in use (may conflict with service)")
         else:
-            print("   ✅ Port 18180 is available")
-    except Exception:
-        warnings.append("Cannot check port availability")
+            warnings.append("Cannot check port availability")
 
     return issues, warnings, missing_packages
 
@@ -1732,63 +2555,248 @@ def show_installation_walkthrough():
     print("Service will run on: http://localhost:18180/")
     print()
 
-    while True:
-        response = input("Proceed with installation? [Y/n]: ").lower().strip()
-        if response in ['', 'y', 'yes']:
-            return True
-        elif response in ['n', 'no']:
-            return False
-        else:
-            print("Please enter 'y' for yes or 'n' for no.")
+    while True:
+        response = input("Proceed with installation? [Y/n]: ").lower().strip()
+        if response in ['', 'y', 'yes']:
+            return True
+        elif response in ['n', 'no']:
+            return False
+        else:
+            print("Please enter 'y' for yes or 'n' for no.")
+
+def fix_prerequisites_guide(missing_packages, script_dir):
+    print("\n" + "="*60)
+    print("🔧 PREREQUISITES FIX GUIDE")
+    print("="*60)
+    print()
+
+    if missing_packages:
+        requirements_file = os.path.join(script_dir, 'requirements.txt')
+
+        print("📦 Install missing Python packages:")
+        print()
+        print("   Option 1 - Install from requirements.txt (recommended):")
+        if os.path.exists(requirements_file):
+            print(f"   pip3 install --break-system-packages -r {requirements_file}")
+        else:
+            print("   requirements.txt not found, use Option 2 or 3")
+        print()
+        print("   Option 2 - Install individually:")
+        print(f"   pip3 install --break-system-packages {' '.join(missing_packages)}")
+        print()
+        print("   Option 3 - Using system package manager:")
+        for pkg in missing_packages:
+            if pkg == 'Flask':
+                print("   sudo apt-get install python3-flask")
+            elif pkg == 'bcrypt':
+                print("   sudo apt-get install python3-bcrypt")
+            elif pkg == 'pyserial':
+                print("   sudo apt-get install python3-serial")
+            elif pkg == 'python-gammu':
+                print("   sudo apt-get install python3-gammu")
+        print()
+
+    print("🔌 GSM Modem Setup:")
+    print("   1. Connect GSM modem via USB")
+    print("   2. Check device: ls /dev/ttyUSB*")
+    print("   3. Add user to dialout group: sudo usermod -a -G dialout $USER")
+    print("   4. Stop ModemManager: sudo systemctl stop ModemManager.service")
+    print()
+
+    print("📶 Test GSM Modem:")
+    print("   gammu identify  # Should detect modem")
+    print("   gammu getnetworkinfo  # Should show network info")
+    print()
+
+@contextlib.contextmanager
+def buffered_stdout():
+    # Install/uninstall print dozens of lines; block-buffer them instead of one write per line.
+    # input() flushes before prompting, and run_command/prompt_for_password flush explicitly.
+    reconfigure = getattr(sys.stdout, 'reconfigure', None)
+    line_buffering = getattr(sys.stdout, 'line_buffering', False)
+    if reconfigure is not None:
+        reconfigure(line_buffering=False)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        if reconfigure is not None:
+            reconfigure(line_buffering=line_buffering)
+
+def run_command(argv, quiet=False):
+    # Runs argv without a shell; returns the exit status, or 127 (as a shell would) if the command is missing
+    sys.stdout.flush()
+    try:
+        return subprocess.run(argv, check=False,
+                              stderr=subprocess.DEVNULL if quiet else None).returncode
+    except FileNotFoundError:
+        return 127
+
+def ensure_install_dir(path, mode=0o755):
+    # One stat decides between mkdir and chmod, instead of makedirs(exist_ok) plus an unconditional chmod
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        os.makedirs(path, mode=mode)
+        os.chmod(path, mode)
+        return
+    if not stat.S_ISDIR(st.st_mode):
+        raise NotADirectoryError(errno.ENOTDIR, os.strerror(errno.ENOTDIR), path)
+    if stat.S_IMODE(st.st_mode) != mode:
+        os.chmod(path, mode)
+
+def remove_install_tree(path):
+    # rm -rf walks and unlinks in C; shutil.rmtree is the fallback (and reports the error) if rm is missing or fails
+    if run_command(['rm', '-rf', '--', path]) != 0 or os.path.lexists(path):
+        shutil.rmtree(path)
+
+def copy_install_file(src, dst, mode=0o644):
+    # Hands the data copy to the kernel: copy_file_range (reflink or in-kernel copy on the same
+    # filesystem), then sendfile, then a plain read/write loop. Only the mode is set on the copy;
+    # timestamps and xattrs of the source checkout are not worth preserving for an installed file
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        sfd, dfd = fsrc.fileno(), fdst.fileno()
+        os.fchmod(dfd, mode)
+        size = os.fstat(sfd).st_size
+        offset = 0
+
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while offset < size:
+                    copied = os.copy_file_range(sfd, dfd, size - offset, offset, offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+            except OSError as e:
+                if offset or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+
+        if offset == 0:
+            try:
+                while offset < size:
+                    sent = os.sendfile(dfd, sfd, offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            except OSError as e:
+                if offset or e.errno not in (errno.EINVAL, errno.ENOSYS):
+                    raise
+                shutil.copyfileobj(fsrc, fdst, 256 * 1024)
+
+def write_install_file(path, content, mode=0o644):
+    # Single unbuffered write to a temp file, fsync, then rename over the target so a
+    # crash mid-install never leaves a truncated unit or config file behind
+    data = content.encode('utf-8')
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        os.fchmod(fd, mode)
+        written = os.write(fd, data)
+        while written < len(data):
+            written += os.write(fd, data[written:])
+        os.fsync(fd)
+    except BaseException:
+        os.close(fd)
+        os.unlink(tmp_path)
+        raise
+    os.close(fd)
+    os.replace(tmp_path, path)
+
+
+# Rendered by install_service(); values are filled in with Template.substitute()
+CONFIG_FILE_TEMPLATE = string.Template("""# SMS REST Server Configuration
+# This file is sourced by systemd service as environment variables
+# Format: KEY=VALUE (shell-style)
+
+# Service port
+PORT=18180
+
+# Authentication file
+HTPASSWD_FILE=${htpasswd_path}
+
+# Modem device (uncomment to specify)
+# DEVICE=/dev/ttyUSB0
+
+# Debug mode (uncomment to enable)
+# DEBUG=true
+
+# Default reply timeout (seconds)
+# SMS_REPLY_TIMEOUT=60
+
+# Worker polling intervals (seconds)
+# REPLY_POLL_INTERVAL=5
+# REPLY_POLL_MAX_INTERVAL=60
+# TIMEOUT_SWEEP_INTERVAL=5
+# QUEUE_WAIT_SECONDS=1
+
+# Maximum queued SMS sent back-to-back per worker pass (SMSC resolved once per batch)
+# SEND_BATCH_SIZE=16
+
+# Message retention window (seconds)
+# MESSAGE_RETENTION_SECONDS=86400
+
+# Maximum queued outgoing SMS before POST / answers 503 QUEUE_FULL
+# SEND_QUEUE_MAX_SIZE=1000
+
+# HTTP worker threads (waitress; ignored in debug mode, which uses the Flask dev server)
+# HTTP_THREADS=8
+
+# Seconds a password check result is reused for repeat requests (0 disables)
+# AUTH_CACHE_TTL=60
+
+# Grafana webhook integration (disabled by default)
+# GRAFANA_WEBHOOK=0
+# GRAFANA_DEFAULT_NUMBER=
+# GRAFANA_MESSAGE_MAX_LENGTH=150
+
+# Configuration priority:
+# 1. Command-line arguments (highest)
+# 2. This file (/etc/default/sms-rest-server)
+# 3. Code defaults (lowest)
+#
+# After modifying this file, restart the service:
+# sudo systemctl restart sms-rest-server
+""")
+
+SYSTEMD_UNIT_TEMPLATE = string.Template("""[Unit]
+Description=SMS REST API Server
+After=network.target
+Wants=network.target
+
+[Service]
+Type=simple
+User=sms-rest-server
+Group=dialout
+SupplementaryGroups=dialout
+WorkingDirectory=${install_dir}
+
+# Load configuration from /etc/default/sms-rest-server
+EnvironmentFile=-${config_file}
 
-def fix_prerequisites_guide(missing_packages, script_dir):
-    print("\n" + "="*60)
-    print("🔧 PREREQUISITES FIX GUIDE")
-    print("="*60)
-    print()
+# Start the service (config file values used if not overridden)
+ExecStart=/usr/bin/python3 ${target_script} --config ${config_file}
 
-    if missing_packages:
-        requirements_file = os.path.join(script_dir, 'requirements.txt')
+Restart=always
+RestartSec=10
+KillMode=mixed
+TimeoutStopSec=5
 
-        print("📦 Install missing Python packages:")
-        print()
-        print("   Option 1 - Install from requirements.txt (recommended):")
-        if os.path.exists(requirements_file):
-            print(f"   pip3 install --break-system-packages -r {requirements_file}")
-        else:
-            print("   requirements.txt not found, use Option 2 or 3")
-        print()
-        print("   Option 2 - Install individually:")
-        print(f"   pip3 install --break-system-packages {' '.join(missing_packages)}")
-        print()
-        print("   Option 3 - Using system package manager:")
-        for pkg in missing_packages:
-            if pkg == 'Flask':
-                print("   sudo apt-get install python3-flask")
-            elif pkg == 'bcrypt':
-                print("   sudo apt-get install python3-bcrypt")
-            elif pkg == 'pyserial':
-                print("   sudo apt-get install python3-serial")
-            elif pkg == 'python-gammu':
-                print("   sudo apt-get install python3-gammu")
-        print()
+# Environment
+Environment=PYTHONUNBUFFERED=1
 
-    print("🔌 GSM Modem Setup:")
-    print("   1. Connect GSM modem via USB")
-    print("   2. Check device: ls /dev/ttyUSB*")
-    print("   3. Add user to dialout group: sudo usermod -a -G dialout $USER")
-    print("   4. Stop ModemManager: sudo systemctl stop ModemManager.service")
-    print()
+# Security settings
+NoNewPrivileges=true
+PrivateTmp=true
+
+[Install]
+WantedBy=multi-user.target
+""")
 
-    print("📶 Test GSM Modem:")
-    print("   gammu identify  # Should detect modem")
-    print("   gammu getnetworkinfo  # Should show network info")
-    print()
 
 def install_service():
-    import shutil
-    import pwd
-    import grp
 
     print("=" * 60)
     print(f"📦 SMS REST SERVICE INSTALLATION v{VERSION}")
@@ -1818,7 +2826,7 @@ def install_service():
                 requirements_file = os.path.join(script_dir, 'requirements.txt')
                 if os.path.exists(requirements_file):
                     print(f"\nInstalling packages from {requirements_file}...")
-                    result = os.system(f'pip3 install --break-system-packages -r "{requirements_file}"')
+                    result = run_command(['pip3', 'install', '--break-system-packages', '-r', requirements_file])
                     if result == 0:
                         print("\n✅ Python packages installed successfully!")
                         print("Please run the installation again: sudo ./sms-rest-server.py --install")
@@ -1863,37 +2871,36 @@ def install_service():
     try:
         # 1. Create installation directory
         print(f"📁 Creating installation directory {install_dir}")
-        os.makedirs(install_dir, exist_ok=True)
-        os.chmod(install_dir, 0o755)
+        ensure_install_dir(install_dir)
 
         # 2. Copy script to installation directory
         print(f"📁 Copying sms-rest-server.py to {target_script}")
-        shutil.copy2(script_path, target_script)
-        os.chmod(target_script, 0o755)
+        copy_install_file(script_path, target_script, mode=0o755)
 
         # 3. Copy requirements.txt to installation directory
         requirements_source = os.path.join(script_dir, 'requirements.txt')
         if os.path.exists(requirements_source):
             print(f"📁 Copying requirements.txt to {target_requirements}")
-            shutil.copy2(requirements_source, target_requirements)
-            os.chmod(target_requirements, 0o644)
+            copy_install_file(requirements_source, target_requirements)
         else:
             print(f"⚠️  requirements.txt not found in {script_dir}, skipping")
 
         # 4. Create system user
         print(f"👤 Creating system user 'sms-rest-server'...")
         try:
-            pwd.getpwnam('sms-rest-server')
+            sms_user = pwd.getpwnam('sms-rest-server')
             print(f"   ℹ️  User 'sms-rest-server' already exists, skipping user creation")
         except KeyError:
-            result = os.system('useradd --system --home-dir /var/lib/sms-rest-server --create-home --shell /bin/false sms-rest-server')
+            result = run_command(['useradd', '--system', '--home-dir', '/var/lib/sms-rest-server', '--create-home',
+                                  '--shell', '/bin/false', 'sms-rest-server'])
             if result != 0:
                 raise Exception("Failed to create system user 'sms-rest-server'")
+            sms_user = pwd.getpwnam('sms-rest-server')
             print(f"   ✅ Created system user 'sms-rest-server' (home: /var/lib/sms-rest-server)")
 
         try:
             grp.getgrnam('dialout')
-            result = os.system('usermod -a -G dialout sms-rest-server')
+            result = run_command(['usermod', '-a', '-G', 'dialout', 'sms-rest-server'])
             if result != 0:
                 raise Exception("Failed to add user to dialout group")
             print(f"   ✅ Added 'sms-rest-server' to dialout group")
@@ -1902,11 +2909,9 @@ def install_service():
 
         # 5. Create data directory
         print(f"📁 Creating data directory {data_dir}")
-        os.makedirs(data_dir, exist_ok=True)
-        os.chmod(data_dir, 0o755)
+        ensure_install_dir(data_dir)
 
         try:
-            sms_user = pwd.getpwnam('sms-rest-server')
             os.chown(data_dir, sms_user.pw_uid, sms_user.pw_gid)
             print(f"   ✅ Set ownership to sms-rest-server:sms-rest-server")
         except Exception as e:
@@ -1915,15 +2920,15 @@ def install_service():
         # 6. Create htpasswd file
         username = "admin"
         htpasswd_created = False
+        htpasswd_preserved = os.path.exists(htpasswd_path)
         admin_pwd = None
-        if not os.path.exists(htpasswd_path):
+        if not htpasswd_preserved:
             print(f"🔐 Creating htpasswd file at {htpasswd_path}")
             admin_pwd = prompt_for_password(username)
             create_htpasswd_file(username, admin_pwd, htpasswd_path)
             htpasswd_created = True
 
             try:
-                sms_user = pwd.getpwnam('sms-rest-server')
                 os.chown(htpasswd_path, sms_user.pw_uid, sms_user.pw_gid)
                 print(f"   ✅ Set htpasswd ownership to sms-rest-server:sms-rest-server")
             except Exception as e:
@@ -1933,7 +2938,6 @@ def install_service():
             print(f"   ℹ️  Preserving existing authentication credentials")
 
             try:
-                sms_user = pwd.getpwnam('sms-rest-server')
                 os.chown(htpasswd_path, sms_user.pw_uid, sms_user.pw_gid)
                 os.chmod(htpasswd_path, 0o600)
                 print(f"   ✅ Validated htpasswd ownership and permissions")
@@ -1941,46 +2945,7 @@ def install_service():
                 print(f"   ⚠️  Could not validate htpasswd: {e}")
 
         # 7. Create config file
-        config_template = f"""# SMS REST Server Configuration
-# This file is sourced by systemd service as environment variables
-# Format: KEY=VALUE (shell-style)
-
-# Service port
-PORT=18180
-
-# Authentication file
-HTPASSWD_FILE={htpasswd_path}
-
-# Modem device (uncomment to specify)
-# DEVICE=/dev/ttyUSB0
-
-# Debug mode (uncomment to enable)
-# DEBUG=true
-
-# Default reply timeout (seconds)
-# SMS_REPLY_TIMEOUT=60
-
-# Worker polling intervals (seconds)
-# REPLY_POLL_INTERVAL=5
-# TIMEOUT_SWEEP_INTERVAL=5
-# QUEUE_WAIT_SECONDS=1
-
-# Message retention window (seconds)
-# MESSAGE_RETENTION_SECONDS=86400
-
-# Grafana webhook integration (disabled by default)
-# GRAFANA_WEBHOOK=0
-# GRAFANA_DEFAULT_NUMBER=
-# GRAFANA_MESSAGE_MAX_LENGTH=150
-
-# Configuration priority:
-# 1. Command-line arguments (highest)
-# 2. This file (/etc/default/sms-rest-server)
-# 3. Code defaults (lowest)
-#
-# After modifying this file, restart the service:
-# sudo systemctl restart sms-rest-server
-"""
+        config_template = CONFIG_FILE_TEMPLATE.substitute(htpasswd_path=htpasswd_path)
 
         config_exists = os.path.exists(config_file)
         preserve_config = False
@@ -2007,64 +2972,33 @@ HTPASSWD_FILE={htpasswd_path}
             config_content = config_template
             print(f"📄 Creating config file at {config_file}")
 
-        with open(config_file, 'w') as f:
-            f.write(config_content)
-        os.chmod(config_file, 0o644)
+        write_install_file(config_file, config_content)
 
         # 8. Create systemd service file
-        service_content = f"""[Unit]
-Description=SMS REST API Server
-After=network.target
-Wants=network.target
-
-[Service]
-Type=simple
-User=sms-rest-server
-Group=dialout
-SupplementaryGroups=dialout
-WorkingDirectory={install_dir}
-
-# Load configuration from /etc/default/sms-rest-server
-EnvironmentFile=-{config_file}
-
-# Start the service (config file values used if not overridden)
-ExecStart=/usr/bin/python3 {target_script} --config {config_file}
-
-Restart=always
-RestartSec=10
-KillMode=mixed
-TimeoutStopSec=5
-
-# Environment
-Environment=PYTHONUNBUFFERED=1
-
-# Security settings
-NoNewPrivileges=true
-PrivateTmp=true
-
-[Install]
-WantedBy=multi-user.target
-"""
+        service_content = SYSTEMD_UNIT_TEMPLATE.substitute(
+            install_dir=install_dir,
+            config_file=config_file,
+            target_script=target_script
+        )
 
         print(f"🔧 Creating systemd service file at {service_file}")
-        with open(service_file, 'w') as f:
-            f.write(service_content)
-        os.chmod(service_file, 0o644)
+        write_install_file(service_file, service_content)
 
         # 9. Reload systemd daemon
         print("🔄 Reloading systemd daemon...")
-        os.system('systemctl daemon-reload')
+        if run_command(['systemctl', 'daemon-reload']) != 0:
+            print("   ⚠️  systemctl daemon-reload failed; run it manually before starting the service")
 
         print("=" * 60)
         print("✅ INSTALLATION COMPLETED SUCCESSFULLY!")
         print("=" * 60)
         print()
 
-        if preserve_config or (os.path.exists(htpasswd_path) and not htpasswd_created):
+        if preserve_config or htpasswd_preserved:
             print("📋 Installation Notes:")
             if preserve_config:
                 print("   ✅ Configuration preserved from previous installation")
-            if os.path.exists(htpasswd_path) and not htpasswd_created:
+            if htpasswd_preserved:
                 print("   ✅ Authentication credentials preserved")
             print()
 
@@ -2156,9 +3090,6 @@ WantedBy=multi-user.target
         sys.exit(1)
 
 def uninstall_service():
-    import shutil
-    import pwd
-    import grp
 
     print("=" * 60)
     print(f"🗑️  SMS REST SERVICE UNINSTALLATION v{VERSION}")
@@ -2219,14 +3150,14 @@ def uninstall_service():
     try:
         if service_exists:
             print("🛑 Stopping service (if running)...")
-            result = os.system('systemctl stop sms-rest-server 2>/dev/null')
+            result = run_command(['systemctl', 'stop', 'sms-rest-server'], quiet=True)
             if result == 0:
                 print("   ✅ Service stopped")
             else:
                 print("   ℹ️  Service was not running")
 
             print("🔓 Disabling service (if enabled)...")
-            result = os.system('systemctl disable sms-rest-server 2>/dev/null')
+            result = run_command(['systemctl', 'disable', 'sms-rest-server'], quiet=True)
             if result == 0:
                 print("   ✅ Service disabled")
             else:
@@ -2237,8 +3168,10 @@ def uninstall_service():
             print("   ✅ Service file removed")
 
             print("🔄 Reloading systemd daemon...")
-            os.system('systemctl daemon-reload')
-            print("   ✅ Systemd daemon reloaded")
+            if run_command(['systemctl', 'daemon-reload']) == 0:
+                print("   ✅ Systemd daemon reloaded")
+            else:
+                print("   ⚠️  systemctl daemon-reload failed; run it manually")
 
         if config_exists:
             print(f"🗑️  Removing config file: {config_file}")
@@ -2247,7 +3180,7 @@ def uninstall_service():
 
         if install_exists:
             print(f"🗑️  Removing installation directory: {install_dir}")
-            shutil.rmtree(install_dir)
+            remove_install_tree(install_dir)
             print("   ✅ Installation directory removed")
 
         if data_exists:
@@ -2256,7 +3189,8 @@ def uninstall_service():
                 response = input(f"Remove data directory {data_dir} (contains htpasswd)? [y/N]: ").lower().strip()
                 if response in ['y', 'yes']:
                     print(f"🗑️  Removing data directory: {data_dir}")
-                    shutil.rmtree(data_dir)
+                    remove_install_tree(data_dir)
+                    data_exists = False
                     print("   ✅ Data directory removed")
                     break
                 elif response in ['', 'n', 'no']:
@@ -2272,7 +3206,7 @@ def uninstall_service():
                 response = input("Remove system user 'sms-rest-server'? [y/N]: ").lower().strip()
                 if response in ['y', 'yes']:
                     print("🗑️  Removing system user 'sms-rest-server'...")
-                    result = os.system('userdel sms-rest-server 2>/dev/null')
+                    result = run_command(['userdel', 'sms-rest-server'], quiet=True)
                     if result == 0:
                         print("   ✅ System user removed")
                     else:
@@ -2297,7 +3231,7 @@ def uninstall_service():
         print("   ✅ Installation files removed")
         print()
 
-        if data_exists and os.path.exists(data_dir):
+        if data_exists:
             print("📁 Remaining Files:")
             print(f"   • Data directory: {data_dir}")
             print("     (manually remove if no longer needed)")
@@ -2320,20 +3254,33 @@ def uninstall_service():
 
 def cleanup_modem():
     global global_modem
+    # Keeps a still-running modem init from starting the worker after shutdown has begun
+    with shutdown_lock:
+        shutdown_requested.set()
     stop_gsm_worker()
-    if global_modem:
-        try:
-            print("\n🔌 Cleaning up modem connection...")
-            global_modem.Terminate()
-            print("✅ Modem connection terminated")
-        except:
-            pass
-        global_modem = None
+    with modem_lock:
+        if global_modem:
+            try:
+                LOG.info("🔌 Cleaning up modem connection...")
+                global_modem.Terminate()
+                LOG.info("✅ Modem connection terminated")
+            except:
+                pass
+            global_modem = None
 
 def signal_handler(signum, frame):
-    print(f"\n🛑 Received signal {signum}, shutting down...")
+    if modem_init_failed:
+        LOG.warning("🛑 Modem initialization failed, shutting down...")
+    else:
+        LOG.info("🛑 Received signal %s, shutting down...", signum)
     cleanup_modem()
-    sys.exit(0)
+    sys.exit(1 if modem_init_failed else 0)
+
+def install_shutdown_handlers():
+    # Registered only once the server is about to run; early exits have nothing to clean up
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    atexit.register(cleanup_modem)
 
 def authenticate_request():
     if not htpasswd_file:
@@ -2343,82 +3290,85 @@ def authenticate_request():
     if not auth:
         return False, None
 
-    users = load_htpasswd_users(htpasswd_file)
-    if auth.username not in users:
-        return False, None
-
-    stored_hash = users[auth.username]
-    if verify_password(stored_hash, auth.password):
+    stored_hash = get_htpasswd_users(htpasswd_file).get(auth.username)
+    # Unknown users still pay for a bcrypt check so response time does not reveal which names exist
+    check_hash = stored_hash or dummy_password_hash(htpasswd_users_cache['dummy_cost'])
+    password_ok = verify_password_cached(check_hash, auth.password)
+    if stored_hash is not None and password_ok:
         return True, auth.username
 
     return False, None
 
-@app.route('/', methods=['POST'])
+
+def route(rule, **options):
+    def decorator(view):
+        ROUTES.append((rule, options, view))
+        return view
+    return decorator
+
+
+def create_app():
+    global app, request, jsonify, Response
+    if app is None:
+        from flask import Flask, Response, request, jsonify
+        app = Flask(__name__)
+        for rule, options, view in ROUTES:
+            app.add_url_rule(rule, view_func=view, **options)
+    return app
+
+
+@route('/', methods=['POST'])
 def send_sms_api():
     authenticated, username = authenticate_request()
     if not authenticated:
-        return build_api_response(
-            status='failed',
-            from_user=username,
-            error_code='AUTHENTICATION_REQUIRED',
-            error_message='Invalid credentials or missing Authorization header',
-            http_status=401
-        )
+        return fixed_error_response('AUTHENTICATION_REQUIRED',
+                                    'Invalid credentials or missing Authorization header', 401)
 
-    if not request.is_json:
-        return build_api_response(
-            status='failed',
-            from_user=username,
-            error_code='INVALID_CONTENT_TYPE',
-            error_message=ERROR_CODES['INVALID_CONTENT_TYPE'],
-            http_status=400
-        )
+    if not modem_ready.is_set():
+        return fixed_error_response('MODEM_NOT_AVAILABLE', 'Modem is still initializing', 503,
+                                    from_user=username)
 
-    data = request.get_json()
+    if not request.is_json:
+        return fixed_error_response('INVALID_CONTENT_TYPE', ERROR_CODES['INVALID_CONTENT_TYPE'], 400,
+                                    from_user=username)
 
-    if not data:
-        return build_api_response(
-            status='failed',
-            from_user=username,
-            error_code='INVALID_JSON',
-            error_message=ERROR_CODES['INVALID_JSON'],
-            http_status=400
-        )
+    try:
+        data = json_loads(request.get_data(cache=False))
+    except ValueError:
+        data = None
 
-    data_lower = {k.lower(): v for k, v in data.items()}
+    if not data or not isinstance(data, dict):
+        return fixed_error_response('INVALID_JSON', ERROR_CODES['INVALID_JSON'], 400, from_user=username)
 
-    phone_number = str(data_lower.get('number', '')) if 'number' in data_lower else None
-    message = str(data_lower.get('message', '')) if 'message' in data_lower else None
-    wait_for_reply = data_lower.get('reply', False)
-    reply_timeout = data_lower.get('timeout', SMS_REPLY_TIMEOUT)
+    # Clients nearly always send lowercase keys; only build a lowercased copy when one isn't
+    data_lower = data
+    if not all(key.islower() for key in data):
+        data_lower = {k.lower(): v for k, v in data.items()}
 
-    required_fields = ['number', 'message']
-    missing_fields = [field for field in required_fields if field not in data_lower]
+    missing_fields = REQUIRED_SEND_FIELDS.difference(data_lower)
     if missing_fields:
         return build_api_response(
             status='failed',
-            to=phone_number,
+            to=str(data_lower['number']) if 'number' in data_lower else None,
             from_user=username,
-            message_text=message,
+            message_text=str(data_lower['message']) if 'message' in data_lower else None,
             error_code='MISSING_REQUIRED_FIELDS',
-            error_message=f'Missing required field(s): {", ".join(missing_fields)}',
+            error_message=f'Missing required field(s): {", ".join(sorted(missing_fields, reverse=True))}',
             http_status=400
         )
 
+    phone_number = data_lower['number']
+    if not isinstance(phone_number, str):
+        phone_number = str(phone_number)
+    message = data_lower['message']
+    if not isinstance(message, str):
+        message = str(message)
+    wait_for_reply = data_lower.get('reply', False)
+    reply_timeout = data_lower.get('timeout', SMS_REPLY_TIMEOUT)
+
     if wait_for_reply and reply_timeout:
-        try:
-            reply_timeout = int(reply_timeout)
-            if reply_timeout < 1 or reply_timeout > 600:
-                return build_api_response(
-                    status='failed',
-                    to=phone_number,
-                    from_user=username,
-                    message_text=message,
-                    error_code='INVALID_TIMEOUT_VALUE',
-                    error_message=ERROR_CODES['INVALID_TIMEOUT_VALUE'],
-                    http_status=400
-                )
-        except (ValueError, TypeError):
+        reply_timeout = parse_reply_timeout(reply_timeout)
+        if reply_timeout is None:
             return build_api_response(
                 status='failed',
                 to=phone_number,
@@ -2428,6 +3378,16 @@ def send_sms_api():
                 error_message=ERROR_CODES['INVALID_TIMEOUT_FORMAT'],
                 http_status=400
             )
+        if reply_timeout < 1 or reply_timeout > 600:
+            return build_api_response(
+                status='failed',
+                to=phone_number,
+                from_user=username,
+                message_text=message,
+                error_code='INVALID_TIMEOUT_VALUE',
+                error_message=ERROR_CODES['INVALID_TIMEOUT_VALUE'],
+                http_status=400
+            )
 
     valid, normalized_number, error_msg = validate_and_normalize_phone(phone_number)
 
@@ -2445,21 +3405,20 @@ def send_sms_api():
     original_phone_number = phone_number
     phone_number = normalized_number
 
-    original_message = message
-    message_truncated = False
+    message_length = len(message)
     meta = None
 
-    if len(message) > 160:
+    if message_length > 160:
         message = message[:160]
-        message_truncated = True
         meta = {
             'truncated': True,
-            'original_length': len(original_message),
+            'original_length': message_length,
             'sent_length': 160
         }
 
     client_ip = request.remote_addr
-    msg_id = str(uuid.uuid4())
+    requires_reply = bool(wait_for_reply)
+    msg_id = new_message_id()
 
     record = create_message_record(
         msg_id,
@@ -2467,23 +3426,32 @@ def send_sms_api():
         normalized_number=phone_number,
         message_text=message,
         username=username,
-        requires_reply=bool(wait_for_reply),
-        timeout_seconds=reply_timeout if wait_for_reply else None,
+        requires_reply=requires_reply,
+        timeout_seconds=reply_timeout if requires_reply else None,
         meta=meta,
         client_ip=client_ip
     )
 
-    job_payload = {
-        'message_id': msg_id,
-        'to_number': phone_number,
-        'message': message,
-        'from_user': username,
-        'requires_reply': bool(wait_for_reply),
-        'timeout_seconds': reply_timeout if wait_for_reply else None,
-        'client_ip': client_ip
-    }
+    job_payload = SendJob(
+        message_id=msg_id,
+        to_number=phone_number,
+        message=message,
+        from_user=username,
+        client_ip=client_ip,
+        requires_reply=requires_reply
+    )
 
-    send_queue.put(job_payload)
+    if not enqueue_send_job(job_payload):
+        return build_api_response(
+            status='failed',
+            to=original_phone_number,
+            from_user=username,
+            message_text=message,
+            error_code='QUEUE_FULL',
+            error_message=ERROR_CODES['QUEUE_FULL'],
+            meta=meta,
+            http_status=503
+        )
 
     return build_api_response(
         status='queued',
@@ -2493,10 +3461,10 @@ def send_sms_api():
         message_text=message,
         meta=meta,
         http_status=200,
-        timestamp_override=record.get('created_at')
+        timestamp_override=record.created_at
     )
 
-@app.route('/health', methods=['GET'])
+@route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy',
@@ -2505,22 +3473,21 @@ def health_check():
     }), 200
 
 
-@app.route('/status', methods=['GET'])
+@route('/status', methods=['GET'])
 def get_message_status():
     authenticated, username = authenticate_request()
     if not authenticated:
-        return build_api_response(
-            status='failed',
-            from_user=username,
-            error_code='AUTHENTICATION_REQUIRED',
-            error_message='Invalid credentials or missing Authorization header',
-            http_status=401
-        )
+        return fixed_error_response('AUTHENTICATION_REQUIRED',
+                                    'Invalid credentials or missing Authorization header', 401)
 
     message_id = request.args.get('message_id')
-    if not message_id and request.is_json:
-        payload = request.get_json(silent=True) or {}
-        message_id = payload.get('message_id')
+    if not message_id and request.content_length and request.is_json:
+        try:
+            payload = json_loads(request.get_data(cache=False))
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict):
+            message_id = payload.get('message_id')
 
     if not message_id:
         return build_api_response(
@@ -2531,7 +3498,7 @@ def get_message_status():
             http_status=400
         )
 
-    record = get_message_record(str(message_id))
+    record = snapshot_message_fields(str(message_id), *STATUS_RESPONSE_FIELDS)
     if not record or record.get('from_user') != username:
         return build_api_response(
             status='failed',
@@ -2558,7 +3525,7 @@ def get_message_status():
     )
 
 
-@app.route('/inbox', methods=['GET'])
+@route('/inbox', methods=['GET'])
 def get_inbox():
     authenticated, username = authenticate_request()
     if not authenticated:
@@ -2580,49 +3547,49 @@ def get_inbox():
     delete_after = parse_bool_param(['delete', 'delete_after'])
     limit = request.args.get('limit', type=int)
 
-    try:
-        sm = get_modem_connection()
-        if not sm:
-            return jsonify({
-                'status': 'failed',
-                'error_code': 'MODEM_NOT_AVAILABLE',
-                'error_message': 'Modem connection not available'
-            }), 503
-
-        all_messages = get_sms_with_locations(sm)
-
-        filtered_messages = []
-        for msg in all_messages:
-            if unread_only and msg.get('State') != 'UnRead':
-                continue
-
-            filtered_messages.append({
-                'number': msg.get('Number', ''),
-                'datetime': msg.get('DateTime').isoformat() if msg.get('DateTime') else None,
-                'text': msg.get('Text', ''),
-                'state': msg.get('State', ''),
-                'location': msg.get('Location', 0),
-                'folder': 0
-            })
-
-            if limit and len(filtered_messages) >= limit:
-                break
+    if not modem_ready.is_set():
+        return jsonify({
+            'status': 'failed',
+            'error_code': 'MODEM_NOT_AVAILABLE',
+            'error_message': 'Modem is still initializing'
+        }), 503
 
-        if delete_after and filtered_messages:
-            deleted_count = 0
-            for msg in all_messages:
+    try:
+        # The GSM worker shares this connection; gammu state machines are not thread-safe
+        with modem_lock:
+            sm = get_modem_connection()
+            if not sm:
+                return jsonify({
+                    'status': 'failed',
+                    'error_code': 'MODEM_NOT_AVAILABLE',
+                    'error_message': 'Modem connection not available'
+                }), 503
+
+            # Read lazily so a limit stops the inbox walk early
+            filtered_messages = []
+            for msg in iter_sms_with_locations(sm):
                 if unread_only and msg.get('State') != 'UnRead':
                     continue
-                try:
-                    sm.DeleteSMS(Folder=0, Location=msg['Location'])
-                    deleted_count += 1
-                except Exception as e:
-                    if debug:
-                        print(f"[INBOX] Failed to delete SMS at location {msg['Location']}: {e}")
 
-                if limit and deleted_count >= limit:
+                filtered_messages.append({
+                    'number': msg.get('Number', ''),
+                    'datetime': msg.get('DateTime').isoformat() if msg.get('DateTime') else None,
+                    'text': msg.get('Text', ''),
+                    'state': msg.get('State', ''),
+                    'location': msg.get('Location', 0),
+                    'folder': 0
+                })
+
+                if limit and len(filtered_messages) >= limit:
                     break
 
+            if delete_after and filtered_messages:
+                for msg in filtered_messages:
+                    try:
+                        sm.DeleteSMS(Folder=0, Location=msg['location'])
+                    except Exception as e:
+                        LOG.debug("[INBOX] Failed to delete SMS at location %s: %s", msg['location'], e)
+
         return jsonify({
             'status': 'success',
             'count': len(filtered_messages),
@@ -2632,7 +3599,6 @@ def get_inbox():
 
     except Exception as e:
         if debug:
-            import traceback
             traceback.print_exc()
         return jsonify({
             'status': 'failed',
@@ -2641,15 +3607,17 @@ def get_inbox():
         }), 500
 
 
-@app.route('/api/v1/alerts', methods=['POST'])
+@route('/api/v1/alerts', methods=['POST'])
 def grafana_webhook_handler():
     if not GRAFANA_WEBHOOK:
         return jsonify({'error': 'Grafana webhook endpoint is disabled'}), 404
 
+    if not modem_ready.is_set():
+        return jsonify({'error': 'Modem is still initializing'}), 503
+
     try:
         client_ip = request.remote_addr
-        if debug:
-            print(f"[GRAFANA] Received webhook from {client_ip}")
+        LOG.debug("[GRAFANA] Received webhook from %s", client_ip)
 
         if not request.is_json:
             return jsonify({'error': 'Content-Type must be application/json'}), 400
@@ -2662,8 +3630,7 @@ def grafana_webhook_handler():
         if not isinstance(alerts_data, list):
             return jsonify({'error': 'Expected JSON array of alerts'}), 400
 
-        if debug:
-            print(f"[GRAFANA] Processing {len(alerts_data)} alerts")
+        LOG.debug("[GRAFANA] Processing %s alerts", len(alerts_data))
 
         results = []
         success_count = 0
@@ -2679,7 +3646,6 @@ def grafana_webhook_handler():
                     error_count += 1
             except Exception as e:
                 if debug:
-                    import traceback
                     traceback.print_exc()
                 results.append({
                     'alert_index': i + 1,
@@ -2697,25 +3663,49 @@ def grafana_webhook_handler():
             'timestamp': format_timestamp()
         }
 
-        if debug:
-            print(f"[GRAFANA] Processing complete: {success_count} successful, {error_count} failed")
+        LOG.debug("[GRAFANA] Processing complete: %s successful, %s failed", success_count, error_count)
 
         return jsonify(response), 200 if error_count == 0 else 207
 
     except Exception as e:
         if debug:
-            import traceback
             traceback.print_exc()
         return jsonify({'error': 'Internal processing error', 'details': str(e)}), 500
 
 
+def run_http_server(port):
+    if not debug:
+        try:
+            from waitress import serve
+        except ImportError:
+            serve = None
+            LOG.warning("[HTTP] waitress not installed, falling back to Flask development server")
+
+        if serve:
+            # waitress keeps HTTP/1.1 connections alive itself; the app must not set the hop-by-hop
+            # Connection header (PEP 3333), which waitress would reject with a 500
+            LOG.info("[HTTP] Serving with waitress on port %s (%s threads)", port, HTTP_THREADS)
+            # One process on purpose: the modem, send queue and message store are in-process state,
+            # so pre-fork servers (gunicorn -w N) would each open the modem. poll() instead of
+            # select() keeps the 1000-connection limit clear of select's 1024-descriptor ceiling.
+            serve(create_app(), host='0.0.0.0', port=port, threads=HTTP_THREADS,
+                  connection_limit=1000, channel_timeout=120, asyncore_use_poll=True,
+                  ident='sms-rest-server')
+            return
+
+    create_app().run(host='0.0.0.0', port=port, debug=debug, use_reloader=debug)
+
+
 def main():
     global htpasswd_file, debug, SERVICE_PORT, modem_device, config_file
-    global SMS_REPLY_TIMEOUT, REPLY_POLL_INTERVAL, TIMEOUT_SWEEP_INTERVAL, QUEUE_WAIT_SECONDS
+    global SMS_REPLY_TIMEOUT, REPLY_POLL_INTERVAL, REPLY_POLL_MAX_INTERVAL, TIMEOUT_SWEEP_INTERVAL, QUEUE_WAIT_SECONDS
+    global SEND_BATCH_SIZE
     global MESSAGE_RETENTION_SECONDS, GRAFANA_WEBHOOK, GRAFANA_DEFAULT_NUMBER, GRAFANA_MESSAGE_MAX_LENGTH
+    global HTTP_THREADS, SEND_QUEUE_MAX_SIZE, AUTH_CACHE_TTL
 
     port = None
     port_from_cli = False
+    check_config = False
 
     try:
         opts, args = getopt.getopt(
@@ -2723,25 +3713,58 @@ def main():
             "hp:a:D:c:di",
             [
                 "help", "port=", "htpasswd=", "device=", "config=", "debug",
-                "install", "uninstall", "create-htpasswd", "update-htpasswd"
+                "install", "uninstall", "create-htpasswd", "update-htpasswd", "bcrypt-cost=",
+                "batch=", "version", "check-config"
             ]
         )
     except getopt.GetoptError as e:
-        print(f"Error: {e}")
-        print_usage()
+        print(f"Error: {e}", file=sys.stderr)
+        print_usage(sys.stderr)
         sys.exit(1)
 
+    # --help/--version win over everything else and exit before any option validation
     for opt, arg in opts:
         if opt in ("-h", "--help"):
             print_usage()
             sys.exit(0)
-        elif opt == "--install":
-            install_service()
+        elif opt == "--version":
+            print(f"sms-rest-server {VERSION}")
+            sys.exit(0)
+
+    bcrypt_cost = BCRYPT_COST
+    batch_file = None
+    for opt, arg in opts:
+        if opt == "--batch":
+            batch_file = arg
+        elif opt == "--bcrypt-cost" and arg.lower() == "auto":
+            bcrypt_cost = calibrate_bcrypt_cost()
+            print(f"Using bcrypt cost {bcrypt_cost} (calibrated for {BCRYPT_AUTO_TARGET_SECONDS * 1000:.0f}ms per hash, "
+                  f"minimum {BCRYPT_COST})")
+        elif opt == "--bcrypt-cost":
+            try:
+                bcrypt_cost = int(arg)
+                if bcrypt_cost < 4 or bcrypt_cost > 16:
+                    raise ValueError("bcrypt cost must be between 4 and 16")
+            except ValueError as e:
+                print(f"Error: Invalid bcrypt cost: {e}")
+                sys.exit(1)
+
+    for opt, arg in opts:
+        if opt == "--install":
+            with buffered_stdout():
+                install_service()
             sys.exit(0)
         elif opt == "--uninstall":
-            uninstall_service()
+            with buffered_stdout():
+                uninstall_service()
             sys.exit(0)
         elif opt in ("--create-htpasswd", "--update-htpasswd"):
+            if batch_file:
+                if len(args) < 1:
+                    print("Error: --batch requires: --create-htpasswd output_file")
+                    sys.exit(1)
+                success = create_htpasswd_batch(batch_file, args[0], bcrypt_cost)
+                sys.exit(0 if success else 1)
             # Expects at least 2 additional arguments: output_file username [password]
             if len(args) < 2:
                 print("Error: --create-htpasswd requires: output_file username [password]")
@@ -2750,25 +3773,31 @@ def main():
                 sys.exit(1)
             output_file, username = args[0], args[1]
             password = args[2] if len(args) >= 3 else prompt_for_password(username)
-            success = create_htpasswd_file(username, password, output_file)
+            success = create_htpasswd_file(username, password, output_file, bcrypt_cost)
             sys.exit(0 if success else 1)
         elif opt in ("-c", "--config"):
             config_file = arg
-            if not os.path.exists(config_file):
-                print(f"Error: config file not found: {config_file}")
+            path_error = validate_path(config_file, 'config file')
+            if path_error:
+                print(f"Error: {path_error}")
                 sys.exit(1)
 
-    config = load_config()
+    config, config_path = load_config()
 
     SMS_REPLY_TIMEOUT = get_int_config(config, 'SMS_REPLY_TIMEOUT', SMS_REPLY_TIMEOUT, 1, 600)
     REPLY_POLL_INTERVAL = get_int_config(config, 'REPLY_POLL_INTERVAL', REPLY_POLL_INTERVAL, 1)
+    REPLY_POLL_MAX_INTERVAL = get_int_config(config, 'REPLY_POLL_MAX_INTERVAL', REPLY_POLL_MAX_INTERVAL, REPLY_POLL_INTERVAL)
     TIMEOUT_SWEEP_INTERVAL = get_int_config(config, 'TIMEOUT_SWEEP_INTERVAL', TIMEOUT_SWEEP_INTERVAL, 1)
     QUEUE_WAIT_SECONDS = get_int_config(config, 'QUEUE_WAIT_SECONDS', QUEUE_WAIT_SECONDS, 1)
+    SEND_BATCH_SIZE = get_int_config(config, 'SEND_BATCH_SIZE', SEND_BATCH_SIZE, 1, 100)
     MESSAGE_RETENTION_SECONDS = get_int_config(config, 'MESSAGE_RETENTION_SECONDS', MESSAGE_RETENTION_SECONDS, 0)
+    SEND_QUEUE_MAX_SIZE = get_int_config(config, 'SEND_QUEUE_MAX_SIZE', SEND_QUEUE_MAX_SIZE, 1)
+    send_queue.maxsize = SEND_QUEUE_MAX_SIZE
+    HTTP_THREADS = get_int_config(config, 'HTTP_THREADS', HTTP_THREADS, 1, 64)
+    AUTH_CACHE_TTL = get_int_config(config, 'AUTH_CACHE_TTL', AUTH_CACHE_TTL, 0, 3600)
     GRAFANA_WEBHOOK = get_bool_config(config, 'GRAFANA_WEBHOOK', GRAFANA_WEBHOOK)
     GRAFANA_MESSAGE_MAX_LENGTH = get_int_config(config, 'GRAFANA_MESSAGE_MAX_LENGTH', GRAFANA_MESSAGE_MAX_LENGTH, 50, 160)
-    if 'GRAFANA_DEFAULT_NUMBER' in config:
-        GRAFANA_DEFAULT_NUMBER = config['GRAFANA_DEFAULT_NUMBER'].strip() if config['GRAFANA_DEFAULT_NUMBER'].strip() else None
+    GRAFANA_DEFAULT_NUMBER = get_str_config(config, 'GRAFANA_DEFAULT_NUMBER', GRAFANA_DEFAULT_NUMBER)
 
     for opt, arg in opts:
         if opt in ("-p", "--port"):
@@ -2782,79 +3811,81 @@ def main():
                 sys.exit(1)
         elif opt in ("-a", "--htpasswd"):
             htpasswd_file = arg
-            if not os.path.exists(htpasswd_file):
-                print(f"Error: htpasswd file not found: {htpasswd_file}")
+            path_error = validate_path(htpasswd_file, 'htpasswd file')
+            if path_error:
+                print(f"Error: {path_error}")
                 sys.exit(1)
         elif opt in ("-D", "--device"):
             modem_device = arg
-            if not os.path.exists(modem_device):
-                print(f"Error: modem device not found: {modem_device}")
+            path_error = validate_path(modem_device, 'modem device', device=True)
+            if path_error:
+                print(f"Error: {path_error}")
                 sys.exit(1)
         elif opt in ("-d", "--debug"):
             debug = True
+        elif opt == "--check-config":
+            check_config = True
 
-    if not port_from_cli and 'PORT' in config:
-        try:
-            port = int(config['PORT'])
-        except ValueError:
-            print(f"Warning: Invalid PORT value in config file: {config['PORT']}")
-
-    if not htpasswd_file and 'HTPASSWD_FILE' in config:
-        htpasswd_file = config['HTPASSWD_FILE']
-
-    if not modem_device and 'DEVICE' in config:
-        modem_device = config['DEVICE']
-
-    if not debug and 'DEBUG' in config:
-        debug = config['DEBUG'].lower() in ['true', '1', 'yes']
-
-    if port is None:
-        port = SERVICE_PORT
+    # CLI values win; the config file only fills in what was not given on the command line
+    if not port_from_cli:
+        port = get_int_config(config, 'PORT', SERVICE_PORT, 1, 65535)
+    if not htpasswd_file:
+        htpasswd_file = get_str_config(config, 'HTPASSWD_FILE', htpasswd_file)
+    if not modem_device:
+        modem_device = get_str_config(config, 'DEVICE', modem_device)
+    if not debug:
+        debug = get_bool_config(config, 'DEBUG', debug)
+
+    # Request and worker threads only enqueue records; one listener thread does the stdout writes
+    log_handler = logging.StreamHandler(sys.stdout)
+    log_handler.setFormatter(logging.Formatter('%(message)s'))
+    log_queue = SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    LOG.addHandler(logging.handlers.QueueHandler(log_queue))
+    LOG.setLevel(logging.DEBUG if debug else logging.INFO)
+    LOG.propagate = False
 
     if not htpasswd_file:
-        print("Error: --htpasswd option is required (or set HTPASSWD_FILE in config)")
-        print("\nYou can:")
-        print("  1. Specify via CLI: --htpasswd /path/to/htpasswd")
-        print("  2. Set in config file: HTPASSWD_FILE=/path/to/htpasswd")
-        print("  3. Use default config: /etc/default/sms-rest-server")
-        print_usage()
+        sys.stderr.write(HTPASSWD_REQUIRED_ERROR)
+        print_usage(sys.stderr)
         sys.exit(1)
 
     modem_info = f"Device: {modem_device}" if modem_device else "Device: Auto-detect"
-    config_source = "Default" if not config_file and not os.path.exists('/etc/default/sms-rest-server') else \
-                    config_file if config_file else "/etc/default/sms-rest-server"
-
-    print(f"""
-SMS REST Server v{VERSION} Starting...
-=============================
-Port: {port}
-Auth file: {htpasswd_file}
-{modem_info}
-Config: {config_source}
-Debug: {debug}
-=============================
-""")
+    config_source = config_path or "Default"
+
+    # One write of the whole banner; flushed so it precedes modem/HTTP log output
+    sys.stdout.write(
+        f"\nSMS REST Server v{VERSION} Starting...\n"
+        "=============================\n"
+        f"Port: {port}\n"
+        f"Auth file: {htpasswd_file}\n"
+        f"{modem_info}\n"
+        f"Config: {config_source}\n"
+        f"Debug: {debug}\n"
+        "=============================\n\n"
+    )
+    sys.stdout.flush()
 
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    atexit.register(cleanup_modem)
+    if check_config:
+        print("✅ Configuration OK (modem and HTTP server not started)")
+        sys.exit(0)
 
     if debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        # The reloader parent never owns the modem, so it keeps default signal handling
         print("🔄 Flask reloader parent process, modem will be initialized after restart")
     else:
-        modem_initialized = initialize_global_modem()
-        if not modem_initialized:
-            print("\n❌ FATAL: Failed to initialize modem. Service cannot start without modem.")
-            print("   Please check:")
-            print("   - GSM modem is connected via USB")
-            print("   - Port permissions (add user to dialout group)")
-            print("   - ModemManager is not interfering (sudo systemctl stop ModemManager)")
-            print("   - Device path is correct (use --device option if needed)")
-            sys.exit(1)
-        start_gsm_worker()
+        install_shutdown_handlers()
+        # Imported here, on the main thread, so a missing python-gammu still fails at startup
+        load_gammu()
+        start_modem_in_background()
 
     try:
-        app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=debug)
+        run_http_server(port)
+        # waitress swallows the SystemExit raised by signal_handler and returns normally
+        if modem_init_failed:
+            sys.exit(1)
     except KeyboardInterrupt:
         print("\n🛑 Interrupted by user")
         cleanup_modem()